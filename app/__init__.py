@@ -0,0 +1,4 @@
+import time
+
+# Process start for startup metrics; workers forked by app.server inherit it
+STARTED_AT = time.monotonic()
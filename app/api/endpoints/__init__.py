@@ -1,2 +1,7 @@
+from .cache import router as cache_router
+from .catalogs import router as catalogs_router
+from .health import router as health_router
+from .jobs import router as jobs_router
+from .metrics import router as metrics_router
 from .processing import router as processing_router
 from .test import router as test_router
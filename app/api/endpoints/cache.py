@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+
+from app.core.security import verify_token
+from app.services import result_cache
+
+router = APIRouter(
+    tags=["cache"], prefix="/cache", dependencies=[Depends(verify_token)]
+)
+
+
+@router.get("")
+async def get_cache_stats():
+    """Result cache size and hit/miss counters of this process."""
+    return result_cache.cache_stats()
+
+
+@router.delete("")
+async def clear_cache():
+    """Remove all cached results."""
+    result_cache.clear()
+    return result_cache.cache_stats()
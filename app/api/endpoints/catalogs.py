@@ -0,0 +1,108 @@
+import asyncio
+import tempfile
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+
+from app.core.logging import logger
+from app.core.security import verify_token
+from app.services import (
+    build_catalog,
+    catalog_meta,
+    catalog_path,
+    delete_catalog,
+    list_catalogs,
+    save_uploaded_files,
+    update_catalog_files,
+)
+from app.services.catalog import DELTA_KEYS
+from app.services.jobs import parse_ahead
+from app.services.matchproducts import FileLoadError, catalog_parse_plan
+
+router = APIRouter(
+    tags=["catalogs"], prefix="/catalogs", dependencies=[Depends(verify_token)]
+)
+
+
+@router.post("")
+async def upload_catalog(files: List[UploadFile] = File(...)):
+    """Upload supplier files and store them as a prepared catalog."""
+    if not files:
+        raise HTTPException(400, "No files provided")
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="catalog_") as temp_dir:
+            temp_path = Path(temp_dir)
+
+            await save_uploaded_files(files, temp_path)
+            await asyncio.to_thread(parse_ahead, catalog_parse_plan(str(temp_path)))
+            return await asyncio.to_thread(build_catalog, str(temp_path))
+
+    except HTTPException:
+        raise
+    except FileLoadError as e:
+        logger.error("Catalog upload failed: %s", str(e))
+        raise HTTPException(422, str(e))
+    except Exception as e:
+        logger.error("Catalog upload failed: %s", str(e))
+        raise HTTPException(500, "Catalog upload failed")
+
+
+@router.get("")
+async def get_catalogs():
+    """List stored catalogs."""
+    return list_catalogs()
+
+
+@router.get("/{catalog_id}")
+async def get_catalog_meta(catalog_id: uuid.UUID):
+    """Catalog metadata with its version history."""
+    return catalog_meta(catalog_id.hex)
+
+
+@router.post("/{catalog_id}/delta")
+async def update_catalog_rows(
+    catalog_id: uuid.UUID,
+    files: Optional[List[UploadFile]] = File(
+        None, description="Supplier files with new and changed rows"
+    ),
+    delete: List[str] = Form([], description="Keys of rows to delete"),
+    key: str = Query(DELTA_KEYS[0], description=f"Row key: {' or '.join(DELTA_KEYS)}"),
+):
+    """Upsert and delete catalog rows, saving a new catalog version.
+
+    Matches started before the update keep using the previous version.
+    """
+    if not files and not delete:
+        raise HTTPException(400, "No changes provided")
+    catalog_path(catalog_id.hex)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="catalog_delta_") as temp_dir:
+            temp_path = Path(temp_dir)
+
+            if files:
+                await save_uploaded_files(files, temp_path)
+                plan = catalog_parse_plan(str(temp_path))
+                await asyncio.to_thread(parse_ahead, plan)
+            return await asyncio.to_thread(
+                update_catalog_files, catalog_id.hex, str(temp_path), key, delete
+            )
+
+    except HTTPException:
+        raise
+    except FileLoadError as e:
+        logger.error("Catalog update failed: %s", str(e))
+        raise HTTPException(422, str(e))
+    except Exception as e:
+        logger.error("Catalog update failed: %s", str(e))
+        raise HTTPException(500, "Catalog update failed")
+
+
+@router.delete("/{catalog_id}")
+async def remove_catalog(catalog_id: uuid.UUID):
+    """Delete stored catalog."""
+    delete_catalog(catalog_id.hex)
+    return {"catalog_id": catalog_id.hex}
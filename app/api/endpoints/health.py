@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Response
+
+from app.services import warmup
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/live")
+async def live():
+    """Process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """Warm-up is done and the process can take matching requests."""
+    if warmup.state["error"]:
+        response.status_code = 503
+        return {"status": "failed", **warmup.state}
+    if not warmup.state["ready"]:
+        response.status_code = 503
+        return {"status": "warming_up"}
+    return {"status": "ready", **warmup.state}
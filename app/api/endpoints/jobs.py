@@ -0,0 +1,80 @@
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Header, Query, UploadFile
+
+from app.core.security import verify_token
+from app.services import get_file_or_404
+from app.services.jobs import (
+    cancel_job,
+    get_job,
+    job_profile_path,
+    job_result_path,
+    start_job,
+)
+from app.services.profiling import PROFILE_FILES, should_profile
+from app.services.writers import resolve_format, result_media_type
+
+router = APIRouter(tags=["jobs"], prefix="/jobs", dependencies=[Depends(verify_token)])
+
+
+@router.post("", status_code=202)
+async def submit_match_job(
+    files: List[UploadFile] = File(...),
+    catalog_id: Optional[uuid.UUID] = Query(
+        None, description="Stored supplier catalog used instead of supplier files"
+    ),
+    format: Optional[str] = Query(
+        None, description="Result format: xlsx, csv, parquet or ndjson"
+    ),
+    compression: Optional[str] = Query(
+        None, description="Compression of csv/ndjson results: gzip"
+    ),
+    accept: Optional[str] = Header(None),
+    profile: bool = Query(False, description="Profile this job"),
+    x_profile: bool = Header(False),
+    batch: bool = Query(
+        False, description="Match each order file on its own, zip the results"
+    ),
+):
+    """Submit matching job and return its id without waiting."""
+    output_format, compression = resolve_format(format, compression, accept)
+    job_id, _ = await start_job(
+        files,
+        catalog_id.hex if catalog_id else None,
+        output_format,
+        compression,
+        should_profile(profile or x_profile),
+        batch=batch,
+    )
+    return get_job(job_id)
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: uuid.UUID):
+    """Job state and per-stage progress."""
+    return get_job(job_id.hex)
+
+
+@router.get("/{job_id}/result")
+async def download_job_result(job_id: uuid.UUID):
+    """Download result of a finished job."""
+    result_path = job_result_path(job_id.hex)
+    return get_file_or_404(result_path, result_media_type(result_path))
+
+
+@router.get("/{job_id}/profile")
+async def download_job_profile(
+    job_id: uuid.UUID,
+    kind: str = Query(
+        "text", description="text summary, folded stacks or raw pstats"
+    ),
+):
+    """Download profile report of a profiled job."""
+    return get_file_or_404(job_profile_path(job_id.hex, kind), PROFILE_FILES[kind][1])
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_match_job(job_id: uuid.UUID):
+    """Cancel queued or running job."""
+    return cancel_job(job_id.hex)
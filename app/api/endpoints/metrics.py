@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.core.security import verify_token
+
+router = APIRouter(tags=["metrics"], dependencies=[Depends(verify_token)])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Prometheus metrics of this process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,81 +1,270 @@
 import asyncio
-import tempfile
+import json
 import uuid
+from concurrent.futures import Future
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 
+from app.core import metrics
 from app.core.logging import logger
 from app.core.security import verify_token
 from app.core.settings import settings
-from app.services import get_file_or_404, match_products_post, remove_folder
+from app.schemas import MatchRequest, MatchResponse
+from app.services import get_file_or_404
+from app.services.jobs import (
+    DONE,
+    FAILED,
+    cancel_job,
+    delete_job,
+    job_result_path,
+    start_job,
+    stream_result_path,
+)
+from app.services.matchproducts import match_records
+from app.services.profiling import should_profile
+from app.services.writers import resolve_format, result_media_type
 
 router = APIRouter(tags=["processing"], prefix="/processing")
 
-ALLOWED_EXTENSIONS = {".xlsx", ".xls"}
-DATA_DIR = settings.DATA_DIR
-MAX_FILE_SIZE = settings.MAX_FILE_SIZE
 
+async def _match_files(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile],
+    catalog_id: Optional[uuid.UUID],
+    output_format: str,
+    compression: Optional[str],
+    profile: bool,
+    batch: bool = False,
+    stream: bool = False,
+) -> Response:
+    """Run a matching job for uploaded files and respond with its result."""
+    job_id, future = await start_job(
+        files,
+        catalog_id.hex if catalog_id else None,
+        output_format,
+        compression,
+        profile,
+        sync=True,
+        batch=batch,
+        stream=stream,
+    )
+    logger.info("Processing session started: %s", job_id)
 
-def validate_file(file: UploadFile) -> None:
-    if not file.filename:
-        raise HTTPException(400, "Filename is required")
+    # A profiled job is kept until JOB_RETENTION so its report can be fetched
+    headers = {}
+    if profile:
+        headers = {
+            "X-Job-Id": job_id,
+            "X-Profile-Url": f"/api/jobs/{job_id}/profile",
+        }
 
-    if Path(file.filename).suffix.lower() not in ALLOWED_EXTENSIONS:
-        raise HTTPException(400, f"Only {ALLOWED_EXTENSIONS} files allowed")
+    if stream:
+        return StreamingResponse(
+            _stream_job(job_id, future, profile),
+            media_type=result_media_type(stream_result_path(job_id)),
+            headers=headers,
+        )
 
+    try:
+        status = await asyncio.wrap_future(future)
+    except Exception as e:
+        status = {"state": FAILED, "error": str(e)}
 
-def validate_file_size(contents: bytes, filename: str):
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(413, f"File {filename} too large")
+    if status["state"] != DONE:
+        logger.error("Processing failed for session %s: %s", job_id, status.get("error"))
+        if not profile:
+            delete_job(job_id)
+        if status.get("file"):
+            raise HTTPException(422, status["error"], headers=headers)
+        raise HTTPException(500, "Processing failed", headers=headers)
 
+    if not profile:
+        background_tasks.add_task(delete_job, job_id)
+    logger.info("Processing completed: %s", job_id)
 
-async def save_uploaded_files(files: List[UploadFile], temp_path: Path) -> None:
-    for file in files:
-        validate_file(file)
-        contents = await file.read()
-        validate_file_size(contents, file.filename)
+    # Small results come back from the worker in memory, large ones as a file
+    # in the job directory, which is removed after the response is sent
+    if status.get("content") is not None:
+        name = status["result_name"]
+        headers["Content-Disposition"] = f'attachment; filename="{name}"'
+        return Response(
+            status["content"], media_type=result_media_type(name), headers=headers
+        )
 
-        file_path = temp_path / file.filename
-        file_path.write_bytes(contents)
-        logger.info("File saved: %s", file.filename)
+    result_path = job_result_path(job_id)
+    response = get_file_or_404(result_path, result_media_type(result_path))
+    response.headers.update(headers)
+    return response
 
 
-def prepare_result_directory(session_id: uuid.UUID, result_path: str) -> Path:
-    result_dir = Path(DATA_DIR) / f"results_{session_id}"
-    result_dir.mkdir(exist_ok=True)
+def _read_lines(path: Path, offset: int) -> Tuple[int, bytes]:
+    """Complete lines appended to a file after offset, and the new offset."""
+    try:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+    except FileNotFoundError:
+        return offset, b""
+    end = data.rfind(b"\n") + 1
+    return offset + end, data[:end]
+
+
+async def _stream_job(
+    job_id: str, future: Future, profile: bool
+) -> AsyncIterator[bytes]:
+    """NDJSON lines of a stream job, sent as the worker writes them.
+
+    A job failing after the response has started ends the stream with an
+    {"error": ...} line. A client that disconnects cancels the job.
+    """
+    path = stream_result_path(job_id)
+    offset = 0
+    try:
+        while not future.done():
+            offset, lines = await asyncio.to_thread(_read_lines, path, offset)
+            if lines:
+                yield lines
+            await asyncio.sleep(settings.STREAM_POLL_INTERVAL)
 
-    final_path = result_dir / "matched_results.xlsx"
-    Path(result_path).rename(final_path)
-    return final_path
+        try:
+            status = future.result()
+        except Exception as e:
+            status = {"state": FAILED, "error": str(e)}
+        if status["state"] == DONE:
+            # A result served from the cache is a different, complete file
+            result = job_result_path(job_id)
+            if result != path:
+                offset = 0
+            _, lines = await asyncio.to_thread(_read_lines, result, offset)
+            yield lines
+            logger.info("Processing completed: %s", job_id)
+        else:
+            logger.error(
+                "Processing failed for session %s: %s", job_id, status.get("error")
+            )
+            error = status["error"] if status.get("file") else "Processing failed"
+            yield json.dumps({"error": error}, ensure_ascii=False).encode() + b"\n"
+    finally:
+        if not future.done():
+            logger.info("Stream closed by client, cancelling job %s", job_id)
+            cancel_job(job_id)
+        if not profile:
+            future.add_done_callback(lambda _: delete_job(job_id))
 
 
 @router.post("/match-orders-tmc", dependencies=[Depends(verify_token)])
 async def match_orders_tmc(
-    background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    catalog_id: Optional[uuid.UUID] = Query(
+        None, description="Stored supplier catalog used instead of supplier files"
+    ),
+    format: Optional[str] = Query(
+        None, description="Result format: xlsx, csv, parquet or ndjson"
+    ),
+    compression: Optional[str] = Query(
+        None, description="Compression of csv/ndjson results: gzip"
+    ),
+    accept: Optional[str] = Header(None),
+    profile: bool = Query(False, description="Profile this session"),
+    x_profile: bool = Header(False),
+    stream: bool = Query(
+        False,
+        description="Stream matches as NDJSON while matching: exact matches, "
+        "fuzzy matches in batches, then a summary line",
+    ),
 ):
-    if not files:
-        raise HTTPException(400, "No files provided")
+    if stream:
+        if (format or "ndjson").lower() != "ndjson" or compression:
+            raise HTTPException(400, "Streamed results are uncompressed ndjson")
+        format, accept = "ndjson", None
+    output_format, compression = resolve_format(format, compression, accept)
+    return await _match_files(
+        background_tasks,
+        files,
+        catalog_id,
+        output_format,
+        compression,
+        should_profile(profile or x_profile),
+        stream=stream,
+    )
 
-    session_id = uuid.uuid4()
-    logger.info("Processing session started: %s", session_id)
 
-    try:
-        with tempfile.TemporaryDirectory(prefix=f"match_{session_id}_") as temp_dir:
-            temp_path = Path(temp_dir)
+@router.post("/match-batch", dependencies=[Depends(verify_token)])
+async def match_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    catalog_id: Optional[uuid.UUID] = Query(
+        None, description="Stored supplier catalog used instead of supplier files"
+    ),
+    format: Optional[str] = Query(
+        None, description="Format of each result: xlsx, csv, parquet or ndjson"
+    ),
+    compression: Optional[str] = Query(
+        None, description="Compression of csv/ndjson results: gzip"
+    ),
+    profile: bool = Query(False, description="Profile this session"),
+    x_profile: bool = Header(False),
+):
+    """Match each order file on its own against one supplier dataset.
+
+    Responds with a zip archive: a result per order file and a summary sheet.
+    """
+    output_format, compression = resolve_format(format, compression, None)
+    return await _match_files(
+        background_tasks,
+        files,
+        catalog_id,
+        output_format,
+        compression,
+        should_profile(profile or x_profile),
+        batch=True,
+    )
 
-            await save_uploaded_files(files, temp_path)
-            result_path = await asyncio.to_thread(match_products_post, str(temp_path))
-            final_path = prepare_result_directory(session_id, result_path)
 
-            background_tasks.add_task(remove_folder, final_path.parent)
-            logger.info("Processing completed: %s", session_id)
+def _match_records(orders, suppliers, catalog_id):
+    with metrics.record_run() as run:
+        return match_records(orders, suppliers, catalog_id), run
 
-            return get_file_or_404(final_path)
 
+@router.post(
+    "/match", response_model=MatchResponse, dependencies=[Depends(verify_token)]
+)
+async def match(request: MatchRequest):
+    """Match order rows given as JSON, without Excel files."""
+    orders = [row.model_dump(by_alias=True) for row in request.orders]
+    suppliers = (
+        [row.model_dump(by_alias=True) for row in request.suppliers]
+        if request.suppliers is not None
+        else None
+    )
+    catalog_id = request.catalog_id.hex if request.catalog_id else None
+
+    try:
+        with metrics.IN_FLIGHT.track_inprogress():
+            matches, run = await asyncio.to_thread(
+                _match_records, orders, suppliers, catalog_id
+            )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error("Processing failed for session %s: %s", session_id, str(e))
+        logger.error("Matching failed: %s", str(e))
+        metrics.FAILURES.labels("match").inc()
         raise HTTPException(500, "Processing failed")
+
+    metrics.observe_run(run)
+    metrics.mark_startup("first_match")
+    return {"matches": matches}
@@ -1,6 +1,12 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import processing_router, test_router
+from app.api.endpoints import (
+    cache_router,
+    catalogs_router,
+    jobs_router,
+    processing_router,
+    test_router,
+)
 
 main_router = APIRouter(
     prefix="/api",
@@ -8,3 +14,6 @@ main_router = APIRouter(
 
 main_router.include_router(test_router)
 main_router.include_router(processing_router)
+main_router.include_router(catalogs_router)
+main_router.include_router(jobs_router)
+main_router.include_router(cache_router)
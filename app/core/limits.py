@@ -0,0 +1,60 @@
+import json
+
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+TOO_LARGE = "Request too large"
+
+
+class RequestSizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_size: int):
+        """Reject request bodies larger than max_size while they are received.
+
+        Starlette parses and spools the whole multipart body before an
+        endpoint sees its UploadFiles, so per-file checks there cannot stop
+        an oversized upload. A declared Content-Length over the limit is
+        rejected before reading; otherwise receiving stops with 413 as soon
+        as the running byte count exceeds it.
+        """
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_size:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Re-raised by FastAPI body parsing, answered by the app
+                    raise HTTPException(413, TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send: Send) -> None:
+        body = json.dumps({"detail": TOO_LARGE}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,183 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional, Union
+
+from prometheus_client import Counter, Gauge, Histogram
+
+import app
+from app.core.settings import settings
+
+STAGES = [
+    "upload",
+    "parse",
+    "normalize",
+    "extract",
+    "exact_match",
+    "fuzzy_match",
+    "write",
+]
+# Метод column values -> method label
+METHOD_LABELS = {
+    "Артикул и размер": "code_size",
+    "Артикул и цвет": "code_color",
+    "Артикул": "code",
+    "Нечеткое": "fuzzy",
+}
+
+STAGE_SECONDS = Histogram(
+    "data_master_stage_duration_seconds",
+    "Duration of matching pipeline stages",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+FRAME_BYTES = Histogram(
+    "data_master_stage_frame_bytes",
+    "Memory of data frames produced by matching pipeline stages",
+    ["stage"],
+    buckets=tuple(2**power for power in range(20, 34)),  # 1MB .. 8GB
+)
+ROWS = Counter(
+    "data_master_rows_processed_total", "Rows read from input data", ["kind"]
+)
+MATCHES = Counter(
+    "data_master_matches_total", "Result rows by match method", ["method"]
+)
+TEXTS = Counter(
+    "data_master_texts_total", "Texts to process before deduplication", ["kind"]
+)
+UNIQUE_TEXTS = Counter(
+    "data_master_unique_texts_total",
+    "Texts actually processed after deduplication",
+    ["kind"],
+)
+FAILURES = Counter("data_master_failures_total", "Failed requests", ["kind"])
+IN_FLIGHT = Gauge("data_master_sessions_in_flight", "Matching sessions in progress")
+TEMP_DISK = Gauge(
+    "data_master_temp_disk_bytes", "Disk space used by working directories", ["dir"]
+)
+STARTUP_SECONDS = Gauge(
+    "data_master_startup_seconds",
+    "Seconds from process start to readiness and to the first finished match",
+    ["phase"],
+)
+
+# Stage timings and counts of the current matching run (see record_run)
+_run: ContextVar[Optional[dict]] = ContextVar("metrics_run", default=None)
+_startup_phases = set()
+
+
+def dir_size(path: Union[str, Path]) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+TEMP_DISK.labels("jobs").set_function(lambda: dir_size(settings.JOBS_DIR))
+TEMP_DISK.labels("cache").set_function(lambda: dir_size(settings.RESULT_CACHE_DIR))
+
+
+@contextmanager
+def record_run():
+    """Collect stage() timings and counts of a run into a plain dict.
+
+    The dict can be sent back from a pool worker and passed to observe_run
+    in the server process, where the Prometheus metrics live.
+    """
+    run = {
+        "timings": {},
+        "rows": {},
+        "methods": {},
+        "memory": {},
+        "dedup": {},
+        "sources": [],
+    }
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        _run.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage of the current run; no-op outside record_run."""
+    run = _run.get()
+    if run is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = run["timings"]
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def add_rows(kind: str, count: int) -> None:
+    run = _run.get()
+    if run is not None:
+        run["rows"][kind] = run["rows"].get(kind, 0) + count
+
+
+def add_memory(name: str, *frames) -> None:
+    """Add deep memory usage of frames produced by a stage of the current run."""
+    run = _run.get()
+    if run is not None:
+        size = sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+        run["memory"][name] = run["memory"].get(name, 0) + size
+
+
+def add_dedup(kind: str, total: int, unique: int) -> None:
+    """Count texts of a kind and how many of them were actually processed."""
+    run = _run.get()
+    if run is not None:
+        counts = run["dedup"].setdefault(kind, [0, 0])
+        counts[0] += total
+        counts[1] += unique
+
+
+def add_sources(sources) -> None:
+    """Record where headers were found in the input files of the current run."""
+    run = _run.get()
+    if run is not None:
+        run["sources"].extend(sources)
+
+
+def add_methods(methods) -> None:
+    """Count result rows per Метод value."""
+    run = _run.get()
+    if run is not None:
+        for method, count in methods.value_counts().items():
+            label = METHOD_LABELS.get(method, str(method))
+            run["methods"][label] = run["methods"].get(label, 0) + int(count)
+
+
+def mark_startup(phase: str) -> None:
+    """Record time since process start the first time a phase is reached."""
+    if phase not in _startup_phases:
+        _startup_phases.add(phase)
+        STARTUP_SECONDS.labels(phase).set(time.monotonic() - app.STARTED_AT)
+
+
+def observe_run(run: Optional[dict]) -> None:
+    if not run:
+        return
+    for name, seconds in run["timings"].items():
+        STAGE_SECONDS.labels(name).observe(seconds)
+    for kind, count in run["rows"].items():
+        ROWS.labels(kind).inc(count)
+    for method, count in run["methods"].items():
+        MATCHES.labels(method).inc(count)
+    for name, size in run.get("memory", {}).items():
+        FRAME_BYTES.labels(name).observe(size)
+    for kind, (total, unique) in run.get("dedup", {}).items():
+        TEXTS.labels(kind).inc(total)
+        UNIQUE_TEXTS.labels(kind).inc(unique)
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -12,8 +13,44 @@ class Settings(BaseSettings):
 
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
     DATA_DIR: Path = BASE_DIR / "app" / "data"
+    CATALOG_DIR: Path = DATA_DIR / "catalogs"
+    JOBS_DIR: Path = DATA_DIR / "jobs"
+    CATALOG_CACHE_SIZE: int = 4  # catalogs kept mapped per process
+    CATALOG_VERSIONS: int = 3  # catalog versions kept after delta updates
+    RESULT_CACHE_DIR: Path = DATA_DIR / "cache"
+    RESULT_CACHE_SIZE: int = 1024 * 1024 * 1024  # 1GB, 0 = disabled
+    RESULT_CACHE_TTL: int = 24 * 60 * 60  # seconds
 
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_REQUEST_SIZE: int = 100 * 1024 * 1024  # 100MB, whole body of one request
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB
+    # Input files of one job parsed at once by pool processes; None = pool size
+    LOAD_WORKERS: Optional[int] = None
+    LOAD_PARALLEL_MIN_SIZE: int = 1024 * 1024  # smaller inputs parsed by the job
+
+    FUZZY_ENGINE: str = "batched"  # batched | legacy
+    FUZZY_WORKERS: int = -1  # -1 = all cores
+    FUZZY_CANDIDATES: int = 0  # top-K token index candidates, 0 = score all
+    FUZZY_RECALL_SAMPLE: int = 0  # queries checked against brute force
+    FUZZY_MEMO_SIZE: int = 100_000  # fuzzy results reused within a session
+    MATCH_CHUNK_SIZE: int = 0  # order rows matched per block, 0 = all at once
+    STREAM_BATCH_ROWS: int = 1000  # order rows per fuzzy batch of streamed results
+    STREAM_POLL_INTERVAL: float = 0.1  # seconds between reads of a streamed result
+
+    # Job processes per server process; None = cores // SERVER_WORKERS
+    JOB_WORKERS: Optional[int] = None
+    JOB_START_METHOD: str = "spawn"  # spawn | forkserver | fork
+    JOB_RETENTION: int = 24 * 60 * 60  # seconds
+    RESULT_MEMORY_ROWS: int = 50_000  # sync results up to this many rows skip disk
+
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 1  # processes forked by app.server
+    WARMUP: bool = True  # run a tiny match and start job workers before ready
+
+    PROFILE_SAMPLE_RATE: float = 0.0  # share of sessions profiled automatically
+    PROFILE_INTERVAL: float = 0.005  # stack sampling interval, seconds
+    PROFILE_TOP: int = 40  # functions in the text summary
 
     class Config:
         env_file = "env/.env"
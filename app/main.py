@@ -1,19 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
+from app.api.endpoints import health_router, metrics_router
 from app.api.routers import main_router
+from app.core.limits import RequestSizeLimitMiddleware
 from app.core.settings import settings
+from app.services import warmup
+from app.services.jobs import (
+    fail_interrupted_jobs,
+    remove_orphaned_results,
+    shutdown_executor,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    remove_orphaned_results()
+    fail_interrupted_jobs()
+    # Requests are served during warm-up; /ready reports when it is done
+    if settings.WARMUP:
+        warm_up = asyncio.create_task(asyncio.to_thread(warmup.warm_up))
+    else:
+        warmup.state["ready"] = True
+    yield
+    if settings.WARMUP and not warm_up.done():
+        await warm_up
+    shutdown_executor()
+
 
 app = FastAPI(
     title=settings.APP_TITLE,
     description=settings.APP_DESCRIPTION,
     version=settings.APP_VERSION,
+    lifespan=lifespan,
 )
 
+app.add_middleware(RequestSizeLimitMiddleware, max_size=settings.MAX_REQUEST_SIZE)
+
 app.include_router(main_router)
+# Prometheus and health probes expect /metrics, /live and /ready at the root
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
 if __name__ == "__main__":
+    # Development server; production runs python -m app.server
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
@@ -0,0 +1 @@
+from .match import MatchRequest, MatchResponse, MatchRow, OrderRow, SupplierRow
@@ -0,0 +1,54 @@
+import uuid
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+
+class OrderRow(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    code: Union[str, int, float, None] = Field(None, alias="Код ТМЦ")
+    name: str = Field(..., alias="Название")
+
+
+class SupplierRow(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    nomenclature: str = Field(..., alias="Номенклатура")
+    book_id: Union[str, int, float, None] = Field(None, alias="BOOK_ID")
+    kiz: Union[str, int, float, None] = Field(None, alias="КИЗ")
+
+
+class MatchRequest(BaseModel):
+    orders: List[OrderRow] = Field(..., min_length=1)
+    suppliers: Optional[List[SupplierRow]] = None
+    catalog_id: Optional[uuid.UUID] = None
+
+    @model_validator(mode="after")
+    def check_supplier_source(self):
+        if (self.suppliers is None) == (self.catalog_id is None):
+            raise ValueError("Exactly one of suppliers or catalog_id is required")
+        return self
+
+
+class MatchRow(BaseModel):
+    code: Union[str, int, float, None] = Field(None, alias="Код ТМЦ")
+    name: str = Field(..., alias="Название")
+    article: Optional[str] = Field(None, alias="Артикул")
+    size: Optional[str] = Field(None, alias="Размер")
+    color: Optional[str] = Field(None, alias="Цвет")
+    nomenclature: str = Field(..., alias="Сопоставленная номенклатура")
+    book_id: Union[str, int, float, None] = Field(None, alias="BOOK_ID")
+    kiz: Union[str, int, float, None] = Field(None, alias="КИЗ")
+    method: Optional[str] = Field(None, alias="Метод")
+    score: Optional[int] = Field(None, alias="Уровень")
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def empty_score(cls, value):
+        # Exact matches have no score, the result table holds "" there
+        return None if value == "" else value
+
+
+class MatchResponse(BaseModel):
+    matches: List[MatchRow]
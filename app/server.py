@@ -0,0 +1,101 @@
+"""Production server: the app is imported once, workers are forked from it.
+
+    python -m app.server --workers 4
+
+Heavy libraries (pandas, pyarrow, openpyxl, rapidfuzz) are loaded in the
+parent before forking, so workers start without importing them and share
+their memory pages copy-on-write. Each worker then warms up on its own and
+reports it through /ready.
+"""
+
+import argparse
+import os
+import signal
+import time
+
+import uvicorn
+
+import app
+from app.core.logging import logger
+from app.core.settings import settings
+
+# Pause before replacing a worker that exited unexpectedly
+RESTART_DELAY = 1.0
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        """
+        Forks uvicorn workers sharing one listening socket and restarts them.
+
+        :param config: Config of the preloaded application
+        :param workers: Number of worker processes
+        """
+        self.config = config
+        self.workers = workers
+        self.socket = config.bind_socket()
+        self.pids = set()
+        self.stopping = False
+
+    def spawn(self, restart: bool = False) -> None:
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            return
+
+        # Worker: uvicorn installs its own handlers for graceful shutdown
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        if restart:
+            app.STARTED_AT = time.monotonic()
+        try:
+            uvicorn.Server(self.config).run(sockets=[self.socket])
+        finally:
+            os._exit(0)
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info("Server started: %s workers, pid %s", self.workers, os.getpid())
+
+        while self.pids:
+            pid, status = os.wait()
+            self.pids.discard(pid)
+            if not self.stopping:
+                logger.error(
+                    "Worker %s exited with status %s, restarting", pid, status
+                )
+                time.sleep(RESTART_DELAY)
+                self.spawn(restart=True)
+        self.socket.close()
+        logger.info("Server stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    args = parser.parse_args()
+    # Job pools of all server processes share the cores (jobs.job_workers)
+    settings.SERVER_WORKERS = args.workers
+
+    # Imports the whole application with its heavy dependencies
+    from app.main import app as application
+
+    config = uvicorn.Config(application, host=args.host, port=args.port)
+    Supervisor(config, args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
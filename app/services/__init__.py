@@ -1,3 +1,5 @@
+from .catalog import catalog_meta, catalog_path, delete_catalog, list_catalogs
 from .get_file_or_404 import get_file_or_404
-from .matchproducts import match_products_post
+from .matchproducts import build_catalog, match_products_post, update_catalog_files
 from .remove_folder import remove_folder
+from .save_uploaded_files import save_uploaded_files
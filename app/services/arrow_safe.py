@@ -0,0 +1,45 @@
+from typing import Collection, Iterable, Set
+
+import pandas as pd
+import pyarrow as pa
+
+
+def _is_mixed(series: pd.Series) -> bool:
+    try:
+        pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return True
+    return False
+
+
+def arrow_safe(df: pd.DataFrame, text_columns: Collection = ()) -> pd.DataFrame:
+    """Convert mixed-type object columns to strings so Arrow can store them.
+
+    :param text_columns: Columns converted to strings even if not mixed
+    """
+    df = df.reset_index(drop=True)
+    for column in df.columns:
+        if column in text_columns or _is_mixed(df[column]):
+            df[column] = df[column].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def mixed_columns(frames: Iterable[pd.DataFrame]) -> Set:
+    """Columns arrow_safe would convert in the concatenation of frames."""
+    mixed = set()
+    samples = {}
+    for df in frames:
+        for column in df.columns:
+            if column in mixed:
+                continue
+            if _is_mixed(df[column]):
+                mixed.add(column)
+                continue
+            # A frame is uniform: one value of it stands for its type
+            sample = df[column].dropna().iloc[:1]
+            if len(sample):
+                samples.setdefault(column, []).append(sample)
+    for column, values in samples.items():
+        if column not in mixed and _is_mixed(pd.concat(values, ignore_index=True)):
+            mixed.add(column)
+    return mixed
@@ -0,0 +1,111 @@
+import re
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# Столбцы и тип результата extract_attributes_frame
+ATTRIBUTE_COLUMNS = ["product_type", "product_code", "size", "color"]
+ATTRIBUTE_DTYPE = "string"
+
+SPECIAL_CHARS = re.compile(r"[^\w\s/-]")
+SPACES = re.compile(r"\s+")
+
+# 1. Тип продукта (первое слово)
+TYPE_PATTERN = re.compile(r"^([^\s]+)")
+
+# 2. Артикул (разные форматы), выигрывает первый совпавший шаблон
+CODE_PATTERNS = [
+    re.compile(r"(\b[a-z]{2,4}\d{2,4}(?:[-\/]\d{2,5}){1,3}\b)"),  # JL126-12/05-25
+    re.compile(r"(\b[a-z]{2,4}\d{2,4}(?:[-\/]\d{1,5}){0,2}\b)"),  # AB123-45/67
+    re.compile(r"(\b\d{2,5}(?:[-\/]\d{2,5}){1,2}\b)"),  # 12-34-56
+    re.compile(r"(\b[a-z]+\d+[a-z]*\b)"),  # ABC123
+    re.compile(r"(\b\d+[a-z]+\d*\b)"),  # 123ABC
+]
+
+# 3. Цвет
+COLOR_PATTERNS = [
+    re.compile(r"(?:цвет|колор|,)\s*([a-zа-яё]+)"),
+    re.compile(r"(\b[a-zа-яё]+)(?=\s*\d{2}\b)"),
+]
+
+# 4. Размер. В extract_attributes на результат влияет только последний
+# шаблон цикла ('complex', первая группа), иначе - последнее двузначное число
+SIZE_PATTERNS = [
+    re.compile(r"(?P<width>\d{2,3})[хx×](?P<length>\d{2,3})[хx×](?P<height>\d{2,3})"),
+    re.compile(r"\b(\d{2})\b(?!.*\d{2})"),
+]
+
+
+def _as_text(texts: pd.Series) -> pd.Series:
+    """Приведение к строкам в нижнем регистре так же, как str(text).lower()"""
+    return texts.astype(object).map(str).str.lower()
+
+
+def _first_match(texts: pd.Series, patterns) -> pd.Series:
+    """Первая группа первого совпавшего шаблона для каждой строки"""
+    result = pd.Series(pd.NA, index=texts.index, dtype=ATTRIBUTE_DTYPE)
+    for pattern in patterns:
+        missing = result.isna()
+        if not missing.any():
+            break
+        found = texts[missing].str.extract(pattern, expand=False)
+        if isinstance(found, pd.DataFrame):
+            found = found.iloc[:, 0]
+        result[missing] = found.astype(ATTRIBUTE_DTYPE)
+    return result
+
+
+def unique_texts(texts: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Уникальные строки столбца и позиции строк столбца среди них
+
+    Значения сравниваются после str(), как их видят normalize_texts и
+    extract_attributes_frame, поэтому результат этих функций для
+    уникальных строк размножается обратно через take(codes).
+
+    :param texts: Столбец с текстом
+    :return: Кортеж (уникальные строки, позиции для каждой строки texts)
+    """
+    codes, uniques = pd.factorize(texts.astype(object).map(str))
+    return pd.Series(uniques, dtype=object), codes
+
+
+def normalize_texts(texts: pd.Series) -> pd.Series:
+    """Нормализация столбца текста, результат как у normalize_text"""
+    return (
+        _as_text(texts)
+        .str.replace(SPECIAL_CHARS, " ", regex=True)  # Удаляем спецсимволы
+        .str.replace(SPACES, " ", regex=True)  # Удаляем лишние пробелы
+        .str.strip()
+    )
+
+
+def extract_attributes_frame(texts: pd.Series) -> pd.DataFrame:
+    """
+    Извлечение атрибутов из столбца названий товаров
+
+    Значения совпадают с extract_attributes, но все шаблоны применяются
+    к столбцу целиком.
+
+    :param texts: Столбец с названиями товаров
+    :return: DataFrame со столбцами ATTRIBUTE_COLUMNS типа ATTRIBUTE_DTYPE
+    """
+    index = texts.index
+    texts = _as_text(texts).reset_index(drop=True)
+
+    product_type = _first_match(texts, [TYPE_PATTERN]).str.replace(
+        ",", "", regex=False
+    )
+    product_code = _first_match(texts, CODE_PATTERNS).str.upper()
+    size = _first_match(texts, SIZE_PATTERNS)
+    color = _first_match(texts, COLOR_PATTERNS).str.strip()
+
+    return pd.DataFrame(
+        {
+            "product_type": product_type,
+            "product_code": product_code,
+            "size": size,
+            "color": color,
+        }
+    ).set_index(index)
@@ -0,0 +1,429 @@
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException
+from pyarrow import feather
+
+from app.core.logging import logger
+from app.core.settings import settings
+from app.services.arrow_safe import arrow_safe
+from app.services.compact import compact_frame, frame_from_arrow, plain_frame
+from app.services.fuzzymatch import (
+    SupplierIndex,
+    TokenIndex,
+    process_choice,
+    type_blocks,
+)
+from app.services.remove_folder import remove_folder
+
+CATALOG_DIR = settings.CATALOG_DIR
+
+SUPPLIER_FILE = "supplier.arrow"
+INDEX_FILE = "index.arrow"
+TOKEN_INDEX_FILE = "tokens.arrow"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+# Columns identifying supplier rows in delta updates
+DELTA_KEYS = ["КИЗ", "BOOK_ID"]
+
+
+def catalog_path(catalog_id: Union[str, uuid.UUID]) -> Path:
+    """Return catalog directory or 404 error."""
+    path = Path(CATALOG_DIR) / str(catalog_id)
+    if not (path / META_FILE).exists():
+        logger.error("Catalog not found: %s", catalog_id)
+        raise HTTPException(404, "Catalog not found")
+    return path
+
+
+def _read_meta(path: Path) -> dict:
+    return json.loads((path / META_FILE).read_text(encoding="utf-8"))
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    """Atomically replace catalog metadata."""
+    tmp_path = path / f".{META_FILE}"
+    tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path / META_FILE)
+
+
+def version_path(
+    catalog_id: Union[str, uuid.UUID], version: Optional[int] = None
+) -> Tuple[Path, int]:
+    """Return data directory and number of a catalog version, current by default.
+
+    Every version is written once to its own directory and never changed,
+    so matches that mapped a version keep reading it while newer versions
+    are saved. Catalogs saved before versioning hold version 1 in the
+    catalog directory itself.
+    """
+    path = catalog_path(catalog_id)
+    if version is None:
+        version = _read_meta(path).get("version", 1)
+    data_path = path / f"v{version}"
+    if version == 1 and not data_path.exists():
+        data_path = path
+    if not (data_path / SUPPLIER_FILE).exists():
+        logger.error("Catalog version not found: %s v%s", catalog_id, version)
+        raise HTTPException(404, "Catalog version not found")
+    return data_path, version
+
+
+def _write_mapped(table: Union[pd.DataFrame, pa.Table], path: Path) -> None:
+    # One uncompressed record batch, so readers can map columns without copies
+    feather.write_feather(
+        table, path, compression="uncompressed", chunksize=max(len(table), 1)
+    )
+
+
+def _array(column: pa.ChunkedArray) -> pa.Array:
+    return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+
+def _list_array(values: np.ndarray, offsets: np.ndarray) -> pa.LargeListArray:
+    return pa.LargeListArray.from_arrays(
+        pa.array(offsets, pa.int64()), pa.array(values, pa.int64())
+    )
+
+
+def _list_arrays(column: pa.ChunkedArray) -> Tuple[np.ndarray, np.ndarray]:
+    """Flat values and offsets of a list<int64> column, viewing its buffers."""
+    array = _array(column)
+    return (
+        array.values.to_numpy(zero_copy_only=True),
+        array.offsets.to_numpy(zero_copy_only=True),
+    )
+
+
+def _write_version(
+    df_supplier: pd.DataFrame, supplier_index: SupplierIndex, target: Path
+) -> None:
+    """Write prepared supplier data and lookup indexes into a new directory.
+
+    The token index is stored too when FUZZY_CANDIDATES is enabled.
+    """
+    tmp_dir = target.parent / f".tmp_{target.name}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        table = arrow_safe(df_supplier)
+        table["fuzzy_key"] = supplier_index.choices
+        if settings.FUZZY_CANDIDATES:
+            token_index = supplier_index.token_index
+            table["token_total"] = token_index.totals
+            _write_mapped(
+                pa.table(
+                    {
+                        "feature": pa.array(token_index.features, pa.large_string()),
+                        "rows": _list_array(token_index.rows, token_index.offsets),
+                        "weight": pa.array(token_index.weights, pa.float64()),
+                    }
+                ),
+                tmp_dir / TOKEN_INDEX_FILE,
+            )
+        _write_mapped(table, tmp_dir / SUPPLIER_FILE)
+
+        blocks = list(supplier_index.blocks.items())
+        rows = [np.empty(0, np.int64)] + [rows for _, rows in blocks]
+        _write_mapped(
+            pa.table(
+                {
+                    "product_type": pa.array([key for key, _ in blocks], pa.string()),
+                    "rows": _list_array(
+                        np.concatenate(rows),
+                        np.cumsum([len(block) for block in rows], dtype=np.int64),
+                    ),
+                }
+            ),
+            tmp_dir / INDEX_FILE,
+        )
+        os.replace(tmp_dir, target)
+    except Exception:
+        remove_folder(tmp_dir)
+        raise
+
+
+def save_catalog(
+    df_supplier: pd.DataFrame, supplier_index: SupplierIndex, files: List[str]
+) -> dict:
+    """Store prepared supplier data and its lookup indexes as version 1."""
+    catalog_id = uuid.uuid4().hex
+    target = Path(CATALOG_DIR) / catalog_id
+    tmp_dir = Path(CATALOG_DIR) / f".tmp_{catalog_id}"
+    tmp_dir.mkdir(parents=True)
+
+    try:
+        _write_version(df_supplier, supplier_index, tmp_dir / "v1")
+        now = datetime.now(timezone.utc).isoformat()
+        meta = {
+            "catalog_id": catalog_id,
+            "created_at": now,
+            "files": [Path(f).name for f in files],
+            "rows": len(df_supplier),
+            "version": 1,
+            "versions": [{"version": 1, "created_at": now, "rows": len(df_supplier)}],
+        }
+        _write_meta(tmp_dir, meta)
+        os.replace(tmp_dir, target)
+    except Exception:
+        remove_folder(tmp_dir)
+        raise
+
+    logger.info("Catalog saved: %s (%s rows)", catalog_id, meta["rows"])
+    return meta
+
+
+def load_catalog(
+    catalog_id: Union[str, uuid.UUID], version: Optional[int] = None
+) -> Tuple[pd.DataFrame, SupplierIndex]:
+    """Map prepared supplier data and lookup indexes of a stored catalog.
+
+    Files are memory-mapped and the frames and indexes view them without
+    copying, so every worker process shares one copy in the page cache.
+    The returned data is read-only.
+    """
+    path, _ = version_path(catalog_id, version)
+
+    df_supplier = frame_from_arrow(
+        feather.read_table(path / SUPPLIER_FILE, memory_map=True)
+    )
+    choices = df_supplier.pop("fuzzy_key").array
+    totals = df_supplier.pop("token_total") if "token_total" in df_supplier else None
+    # Catalogs saved before compact dtypes are converted here
+    df_supplier = compact_frame(df_supplier)
+
+    index = feather.read_table(path / INDEX_FILE, memory_map=True)
+    rows, offsets = _list_arrays(index.column("rows"))
+    blocks = {
+        product_type: rows[offsets[i] : offsets[i + 1]]
+        for i, product_type in enumerate(index.column("product_type").to_pylist())
+    }
+
+    token_index = None
+    if totals is not None and (path / TOKEN_INDEX_FILE).exists():
+        tokens = feather.read_table(path / TOKEN_INDEX_FILE, memory_map=True)
+        token_rows, token_offsets = _list_arrays(tokens.column("rows"))
+        token_index = TokenIndex.restore(
+            frame_from_arrow(tokens.select(["feature"]))["feature"].array,
+            token_rows,
+            token_offsets,
+            _array(tokens.column("weight")).to_numpy(zero_copy_only=True),
+            totals.to_numpy(),
+        )
+    return df_supplier, SupplierIndex(choices, blocks, token_index)
+
+
+@lru_cache(maxsize=settings.CATALOG_CACHE_SIZE)
+def _cached_catalog(
+    catalog_id: str, version: int
+) -> Tuple[pd.DataFrame, SupplierIndex]:
+    return load_catalog(catalog_id, version)
+
+
+def get_catalog(
+    catalog_id: Union[str, uuid.UUID], version: Optional[int] = None
+) -> Tuple[pd.DataFrame, SupplierIndex]:
+    """Like load_catalog, but keeps recently used catalog versions in memory.
+
+    Returned data is shared between callers and must not be modified.
+    """
+    _, version = version_path(catalog_id, version)
+    return _cached_catalog(str(catalog_id), version)
+
+
+@contextmanager
+def _catalog_lock(path: Path):
+    """Serialize updates of one catalog across server and worker processes."""
+    with open(path / LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _key_strings(values) -> pd.Series:
+    """Delta keys compared as text: 123, 123.0 and "123" are the same key."""
+
+    def text(value):
+        if pd.isna(value):
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip() or None
+
+    return pd.Series(values, dtype=object).map(text)
+
+
+def _delta_rows(
+    old_keys: pd.Series, delta_keys: pd.Series, deleted: Iterable[str]
+) -> Tuple[np.ndarray, dict]:
+    """Rows of the updated catalog as positions in old rows + delta rows.
+
+    A delta row replaces the first stored row with its key, in place, and
+    other stored rows with that key are dropped; delta rows with new keys
+    are appended in delta order.
+    """
+    size = len(old_keys)
+    delta_position = pd.Index(delta_keys).get_indexer(old_keys)
+    replaced = delta_position >= 0
+    removed = old_keys.isin(deleted).to_numpy()
+    first = (~old_keys.duplicated(keep="first") | old_keys.isna()).to_numpy()
+
+    source = np.arange(size)
+    source[replaced] = size + delta_position[replaced]
+    keep = ~removed & (first | ~replaced)
+    added = np.setdiff1d(np.arange(len(delta_keys)), delta_position[replaced])
+    rows = np.concatenate([source[keep], size + added])
+    counts = {
+        "updated": int((replaced & first).sum()),
+        "added": len(added),
+        "deleted": int(removed.sum()),
+    }
+    return rows, counts
+
+
+def update_catalog(
+    catalog_id: Union[str, uuid.UUID],
+    df_delta: Optional[pd.DataFrame],
+    key: str,
+    deleted: Iterable[str] = (),
+    files: Iterable[str] = (),
+) -> dict:
+    """Upsert and delete rows of a stored catalog, saving a new version.
+
+    Only delta rows are prepared and parsed into the indexes: the token
+    index keeps the features of unchanged rows, product type blocks are
+    regrouped from stored types. The last CATALOG_VERSIONS versions are
+    kept for matches that still use them.
+
+    :param df_delta: Prepared delta rows (prepare_supplier), None to only delete
+    :param key: Column identifying rows, one of DELTA_KEYS
+    :param deleted: Keys of rows to delete
+    :param files: Names of delta files, recorded in the version history
+    :return: Catalog metadata
+    """
+    if key not in DELTA_KEYS:
+        raise HTTPException(400, f"Only {DELTA_KEYS} keys supported")
+    delta_keys = _key_strings([] if df_delta is None else df_delta[key])
+    if delta_keys.isna().any():
+        raise HTTPException(422, f"Delta rows without {key}")
+    deleted = set(_key_strings(list(deleted)).dropna())
+    if deleted & set(delta_keys):
+        raise HTTPException(422, "Keys are both updated and deleted")
+    # Repeated key in the delta: its last row wins
+    last = ~delta_keys.duplicated(keep="last").to_numpy()
+    delta_keys = delta_keys[last].reset_index(drop=True)
+
+    path = catalog_path(catalog_id)
+    with _catalog_lock(path):
+        meta = _read_meta(path)
+        version = meta.get("version", 1)
+        df_old, old_index = load_catalog(catalog_id, version)
+        df_delta = df_old.iloc[:0] if df_delta is None else df_delta[last]
+        rows, counts = _delta_rows(_key_strings(df_old[key]), delta_keys, deleted)
+
+        df_supplier = compact_frame(
+            pd.concat([plain_frame(df_old), plain_frame(df_delta)], ignore_index=True)
+            .iloc[rows]
+            .reset_index(drop=True)
+        )
+        delta_choices = np.array(
+            [process_choice(text) for text in df_delta["normalized"]], dtype=object
+        )
+        choices = np.concatenate(
+            [np.asarray(old_index.choices, dtype=object), delta_choices]
+        )[rows]
+        token_index = None
+        if settings.FUZZY_CANDIDATES:
+            positions = np.full(len(df_old) + len(df_delta), -1, dtype=np.int64)
+            positions[rows] = np.arange(len(rows))
+            added_rows = np.flatnonzero(rows >= len(df_old))
+            token_index = old_index.token_index.updated(
+                positions[: len(df_old)],
+                len(rows),
+                added_rows,
+                choices[added_rows],
+            )
+        supplier_index = SupplierIndex(
+            choices, type_blocks(df_supplier["product_type"]), token_index
+        )
+
+        version += 1
+        _write_version(df_supplier, supplier_index, path / f"v{version}")
+        now = datetime.now(timezone.utc).isoformat()
+        meta.setdefault(
+            "versions",
+            [{"version": 1, "created_at": meta["created_at"], "rows": meta["rows"]}],
+        )
+        meta["versions"].append(
+            {
+                "version": version,
+                "created_at": now,
+                "rows": len(df_supplier),
+                "key": key,
+                "files": [Path(f).name for f in files],
+                **counts,
+            }
+        )
+        meta.update(version=version, updated_at=now, rows=len(df_supplier))
+        _write_meta(path, meta)
+        _remove_old_versions(path, version)
+
+    logger.info(
+        "Catalog updated: %s v%s (%s rows, %s)",
+        catalog_id,
+        version,
+        len(df_supplier),
+        counts,
+    )
+    return meta
+
+
+def _remove_old_versions(path: Path, version: int) -> None:
+    """Keep the last CATALOG_VERSIONS versions of a catalog.
+
+    Processes that mapped a removed version keep reading its files until
+    they unmap them.
+    """
+    oldest = version - max(settings.CATALOG_VERSIONS, 1) + 1
+    for old in range(1, oldest):
+        data_path = path / f"v{old}"
+        if data_path.exists():
+            remove_folder(data_path)
+        elif old == 1:
+            for name in (SUPPLIER_FILE, INDEX_FILE, TOKEN_INDEX_FILE):
+                (path / name).unlink(missing_ok=True)
+
+
+def catalog_meta(catalog_id: Union[str, uuid.UUID]) -> dict:
+    """Return metadata and version history of a stored catalog."""
+    return _read_meta(catalog_path(catalog_id))
+
+
+def list_catalogs() -> List[dict]:
+    """Return metadata of all stored catalogs, newest first."""
+    catalogs = []
+    root = Path(CATALOG_DIR)
+    if root.exists():
+        for meta_file in root.glob(f"*/{META_FILE}"):
+            if meta_file.parent.name.startswith("."):
+                continue
+            catalogs.append(json.loads(meta_file.read_text(encoding="utf-8")))
+    return sorted(catalogs, key=lambda meta: meta["created_at"], reverse=True)
+
+
+def delete_catalog(catalog_id: Union[str, uuid.UUID]) -> None:
+    """Delete stored catalog or raise 404 error."""
+    remove_folder(catalog_path(catalog_id))
+    _cached_catalog.cache_clear()
+    logger.info("Catalog deleted: %s", catalog_id)
@@ -0,0 +1,77 @@
+import pandas as pd
+import pyarrow as pa
+
+# Строки в Arrow: значения лежат в одном буфере, а не отдельными объектами Python
+TEXT_DTYPE = "string[pyarrow]"
+# Извлечённые атрибуты с небольшим числом различных значений
+CATEGORY_COLUMNS = ["product_type", "size", "color"]
+
+
+def _is_text(series: pd.Series) -> bool:
+    if not (series.dtype == object or isinstance(series.dtype, pd.StringDtype)):
+        return False
+    return pd.api.types.infer_dtype(series, skipna=True) == "string"
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Атрибуты как category, текстовые столбцы как строки Arrow
+
+    Преобразуются только столбцы, в которых нет ничего, кроме строк, поэтому
+    числа из Excel сохраняют свой тип в результате.
+    """
+    dtypes = {}
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column in CATEGORY_COLUMNS:
+            if not isinstance(dtype, pd.CategoricalDtype):
+                dtypes[column] = "category"
+        elif _is_text(df[column]) and dtype != TEXT_DTYPE:
+            dtypes[column] = TEXT_DTYPE
+    # astype копирует все столбцы, поэтому уже компактная таблица не меняется
+    return df.astype(dtypes) if dtypes else df
+
+
+def plain_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Столбцы category и строк Arrow обратно в object для вывода результата"""
+    columns = [
+        column
+        for column in df.columns
+        if isinstance(df[column].dtype, (pd.CategoricalDtype, pd.StringDtype))
+    ]
+    return df.astype({column: object for column in columns})
+
+
+def _column_array(column: pa.ChunkedArray):
+    """Массив pandas поверх буферов столбца Arrow без их копирования"""
+    array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        return pd.arrays.ArrowStringArray(pa.chunked_array([array]))
+    if array.null_count:
+        return array.to_pandas()
+    if pa.types.is_dictionary(array.type):
+        return pd.Categorical.from_codes(
+            array.indices.to_numpy(zero_copy_only=True),
+            categories=array.dictionary.to_pandas(),
+            validate=False,
+        )
+    if pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+        return array.to_numpy(zero_copy_only=True)
+    return array.to_pandas()
+
+
+def frame_from_arrow(table: pa.Table) -> pd.DataFrame:
+    """
+    Компактная таблица поверх буферов таблицы Arrow
+
+    Для отображённой в память таблицы текст, коды категорий и числа без
+    пропусков остаются в файле: процессы, отобразившие один файл, делят его
+    страницы, а таблица доступна только для чтения.
+    """
+    return pd.DataFrame(
+        {
+            name: pd.Series(_column_array(table.column(name)), copy=False)
+            for name in table.column_names
+        },
+        copy=False,
+    )
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Этапы точного сопоставления: значение "Метод" -> ключи. Каждый этап
+# получает только строки заказа, не сопоставленные на предыдущих
+EXACT_STAGES = {
+    "Артикул и размер": ["product_code", "size"],
+    "Артикул и цвет": ["product_code", "color"],
+    "Артикул": ["product_code"],
+}
+
+
+def _keys(df, columns):
+    """Ключи строк как Index (MultiIndex для нескольких столбцов) и маска
+    строк, у которых заполнены все столбцы ключа"""
+    frame = df[columns]
+    valid = frame.notna().all(axis=1).to_numpy()
+    values = [frame[column].to_numpy(dtype=object)[valid] for column in columns]
+    if len(values) == 1:
+        return pd.Index(values[0], dtype=object), valid
+    return pd.MultiIndex.from_arrays(values), valid
+
+
+class ExactIndex:
+    def __init__(self, df_supplier):
+        """
+        Хеш-индексы каталога поставщика для каскадного точного сопоставления.
+
+        Для каждого этапа EXACT_STAGES ключ -> позиция строки поставщика.
+        Строки с пустым ключом в индекс не попадают; из строк с одинаковым
+        ключом берётся первая по порядку каталога.
+
+        :param df_supplier: Подготовленный каталог поставщика
+        """
+        self.size = len(df_supplier)
+        self.stages = {}
+        for method, columns in EXACT_STAGES.items():
+            if not set(columns) <= set(df_supplier.columns):
+                continue
+            keys, valid = _keys(df_supplier, columns)
+            positions = np.flatnonzero(valid)
+            first = ~keys.duplicated(keep="first")
+            self.stages[method] = (keys[first], positions[first])
+
+    def match(self, df_order):
+        """
+        Каскадное сопоставление строк заказа
+
+        Каждый этап ищет в своём индексе только ещё не сопоставленные
+        строки, поэтому работа этапа растёт с числом оставшихся строк.
+
+        :param df_order: Подготовленный заказ со столбцами ключей
+        :return: Кортеж (позиции строк поставщика, значения "Метод");
+            -1 и None для несопоставленных строк
+        """
+        positions = np.full(len(df_order), -1, dtype=np.int64)
+        methods = np.full(len(df_order), None, dtype=object)
+        remaining = np.arange(len(df_order))
+        for method, (keys, supplier_rows) in self.stages.items():
+            columns = EXACT_STAGES[method]
+            if not len(remaining) or not set(columns) <= set(df_order.columns):
+                continue
+            order_keys, valid = _keys(df_order.iloc[remaining], columns)
+            found = keys.get_indexer(order_keys)
+            rows = remaining[valid][found >= 0]
+            positions[rows] = supplier_rows[found[found >= 0]]
+            methods[rows] = method
+            remaining = remaining[positions[remaining] < 0]
+        return positions, methods
@@ -0,0 +1,480 @@
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import utils
+from rapidfuzz import fuzz
+from rapidfuzz import process
+
+from app.core.logging import logger
+
+FUZZY_SCORE_CUTOFF = 90
+
+# Длина n-грамм для токенов-артикулов (токенов с цифрами)
+NGRAM_SIZE = 3
+
+# Максимальное число ячеек матрицы оценок, считаемых за один вызов cdist
+# (8 млн float64 ~ 64 МБ). Большие группы режутся на блоки по строкам.
+MAX_BLOCK_CELLS = 8_000_000
+
+
+def process_query(text):
+    """Обработка запроса так же, как её делает fuzzywuzzy.process.extractOne"""
+    return utils.full_process(utils.full_process(text), force_ascii=True)
+
+
+def process_choice(text):
+    """Обработка варианта так же, как её делает fuzzywuzzy.process.extractOne"""
+    return utils.full_process(text, force_ascii=True)
+
+
+def best_matches(queries, choices, score_cutoff=FUZZY_SCORE_CUTOFF, workers=-1):
+    """
+    Лучший вариант для каждого запроса по token_set_ratio.
+
+    Строки должны быть уже обработаны process_query/process_choice.
+    Оценки округляются как в fuzzywuzzy, при равенстве берётся первый вариант.
+
+    :param queries: Список обработанных запросов
+    :param choices: Список обработанных вариантов
+    :param score_cutoff: Минимальная оценка совпадения
+    :param workers: Количество потоков для cdist (-1 - все ядра)
+    :return: Кортеж (позиции лучших вариантов, оценки), -1 если совпадения нет
+    """
+    positions = np.full(len(queries), -1, dtype=np.int64)
+    scores = np.zeros(len(queries), dtype=np.int64)
+    if not len(queries) or not len(choices):
+        return positions, scores
+
+    # fuzzywuzzy считает пустые строки равными (оценка 100), rapidfuzz - нет
+    empty_choices = np.flatnonzero(np.array([not c for c in choices]))
+
+    step = max(1, MAX_BLOCK_CELLS // len(choices))
+    for start in range(0, len(queries), step):
+        block = queries[start : start + step]
+        matrix = process.cdist(
+            block,
+            choices,
+            scorer=fuzz.token_set_ratio,
+            score_cutoff=score_cutoff - 0.5,
+            dtype=np.float64,
+            workers=workers,
+        )
+        matrix = np.round(matrix)
+        best = matrix.argmax(axis=1)
+        best_scores = matrix[np.arange(len(block)), best]
+
+        for i, query in enumerate(block):
+            if not query and len(empty_choices):
+                best[i], best_scores[i] = empty_choices[0], 100
+
+        found = best_scores >= score_cutoff
+        positions[start : start + len(block)] = np.where(found, best, -1)
+        scores[start : start + len(block)] = np.where(found, best_scores, 0)
+
+    return positions, scores
+
+
+def text_features(text):
+    """
+    Признаки строки для TokenIndex: токены и n-граммы токенов с цифрами
+
+    N-граммы помечаются "#", такой символ не остаётся в строках после
+    full_process, поэтому они не пересекаются с токенами.
+    """
+    features = set()
+    for token in text.split():
+        features.add(token)
+        if any(char.isdigit() for char in token) and len(token) > NGRAM_SIZE:
+            features.update(
+                "#" + token[i : i + NGRAM_SIZE]
+                for i in range(len(token) - NGRAM_SIZE + 1)
+            )
+    return features
+
+
+def _feature_pairs(vocabulary, rows, choices):
+    """
+    Пары (номер признака, строка) для строк каталога
+
+    Новые признаки добавляются в vocabulary (признак -> номер).
+    """
+    features, feature_rows = [], []
+    for row, text in zip(rows, choices):
+        for feature in text_features(text):
+            features.append(vocabulary.setdefault(feature, len(vocabulary)))
+            feature_rows.append(row)
+    return (
+        np.asarray(features, dtype=np.int64),
+        np.asarray(feature_rows, dtype=np.int64),
+    )
+
+
+class TokenIndex:
+    def __init__(self, choices):
+        """
+        Инвертированный индекс признаков text_features -> строки поставщика.
+
+        :param choices: Массив строк, обработанных process_choice
+        """
+        vocabulary = {}
+        features, rows = _feature_pairs(vocabulary, range(len(choices)), choices)
+        self._set_pairs(vocabulary, features, rows, len(choices))
+
+    def _set_pairs(self, vocabulary, features, rows, size):
+        """Индекс по парам (номер признака, строка поставщика)"""
+        self.size = size
+        self.features = list(vocabulary)
+        self._vocabulary = vocabulary
+
+        counts = np.bincount(features, minlength=len(vocabulary))
+        # Строки внутри признака идут по возрастанию, как при полном построении
+        order = np.lexsort((rows, features))
+        self.rows = rows[order]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        # Редкие признаки весят больше (idf)
+        self.weights = np.log((self.size + 1) / np.maximum(counts, 1))
+        self.totals = np.bincount(
+            rows, weights=self.weights[features], minlength=self.size
+        )
+
+    @classmethod
+    def restore(cls, features, rows, offsets, weights, totals):
+        """
+        Индекс из сохранённых массивов (например, отображённых в память)
+
+        :param features: Признаки в порядке их номеров
+        :param rows: Строки поставщика, сгруппированные по признакам
+        :param offsets: Начало группы каждого признака в rows
+        :param weights: Вес каждого признака
+        :param totals: Суммарный вес признаков каждой строки поставщика
+        """
+        index = cls.__new__(cls)
+        index.size = len(totals)
+        index.features = features
+        index._vocabulary = None
+        index.rows, index.offsets = rows, offsets
+        index.weights, index.totals = weights, totals
+        return index
+
+    def updated(self, kept, size, added_rows, added_choices):
+        """
+        Индекс изменённого каталога без разбора неизменённых строк
+
+        Признаки сохранённых строк берутся из индекса, text_features
+        считается только для добавленных строк; результат совпадает с
+        индексом, построенным по изменённому каталогу заново.
+
+        :param kept: Новая позиция каждой строки индекса, -1 - строка удалена
+            или заменена
+        :param size: Количество строк изменённого каталога
+        :param added_rows: Позиции добавленных и заменённых строк
+        :param added_choices: Их строки, обработанные process_choice
+        """
+        features = np.repeat(
+            np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets)
+        )
+        rows = np.asarray(kept, dtype=np.int64)[self.rows]
+        features, rows = features[rows >= 0], rows[rows >= 0]
+
+        vocabulary = dict(self.vocabulary)
+        new_features, new_rows = _feature_pairs(vocabulary, added_rows, added_choices)
+        index = TokenIndex.__new__(TokenIndex)
+        index._set_pairs(
+            vocabulary,
+            np.concatenate([features, new_features]),
+            np.concatenate([rows, new_rows]),
+            size,
+        )
+        return index
+
+    @property
+    def vocabulary(self):
+        """Признак -> номер; у восстановленного индекса строится при обращении"""
+        if self._vocabulary is None:
+            self._vocabulary = {
+                feature: feature_id for feature_id, feature in enumerate(self.features)
+            }
+        return self._vocabulary
+
+    def candidates(self, query, block, k):
+        """
+        Top-K строк блока по доле общих с запросом признаков (с весами)
+
+        :param query: Строка, обработанная process_query
+        :param block: Позиции строк поставщика, среди которых идёт поиск
+        :param k: Количество кандидатов
+        :return: Позиции кандидатов по возрастанию
+        """
+        if k >= len(block):
+            return block
+
+        features = text_features(query)
+        ids = [self.vocabulary[f] for f in features if f in self.vocabulary]
+        scores = np.zeros(self.size)
+        if ids:
+            starts, ends = self.offsets[ids], self.offsets[np.add(ids, 1)]
+            rows = np.concatenate([self.rows[a:b] for a, b in zip(starts, ends)])
+            weights = np.repeat(self.weights[ids], ends - starts)
+            shared = np.bincount(rows, weights=weights, minlength=self.size)
+
+            # token_set_ratio равен 100, когда набор токенов одной строки
+            # входит в другую, поэтому общий вес делится на меньший из весов
+            unknown = (len(features) - len(ids)) * np.log(self.size + 1)
+            total = self.weights[ids].sum() + unknown
+            scores = shared / np.maximum(np.minimum(self.totals, total), 1e-12)
+        # При равном весе берутся строки, стоящие раньше в каталоге
+        scores = scores[block]
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        return block[np.sort(np.concatenate([above, ties]))]
+
+
+class SupplierIndex:
+    def __init__(self, choices, blocks, token_index=None):
+        """
+        Предобработанные данные поставщика для нечеткого поиска.
+
+        :param choices: Массив строк, обработанных process_choice
+        :param blocks: Словарь product_type -> позиции строк поставщика
+        :param token_index: Готовый TokenIndex, иначе строится по требованию
+        """
+        self.choices = choices
+        self.blocks = blocks
+        self._token_index = token_index
+
+    @property
+    def token_index(self):
+        """TokenIndex строится один раз при первом обращении"""
+        if self._token_index is None:
+            self._token_index = TokenIndex(self.choices)
+        return self._token_index
+
+    @classmethod
+    def build(cls, df_supplier):
+        """Строит индекс по подготовленному каталогу поставщика"""
+        choices = np.array(
+            [process_choice(text) for text in df_supplier["normalized"]], dtype=object
+        )
+        return cls(choices, type_blocks(df_supplier["product_type"]))
+
+
+def type_blocks(product_types):
+    """Словарь product_type -> позиции строк поставщика"""
+    product_types = np.asarray(product_types)
+    return pd.Series(product_types).groupby(product_types, sort=False).indices
+
+
+def match_positions(queries, order_types, supplier_index, candidates=0, workers=-1):
+    """
+    Лучшие строки поставщика для запросов, сгруппированных по типу продукта
+
+    :param queries: Массив строк, обработанных process_query
+    :param order_types: Тип продукта каждого запроса (NaN - весь каталог)
+    :param supplier_index: SupplierIndex поставщика
+    :param candidates: Сколько кандидатов из TokenIndex оценивать для
+        каждого запроса, 0 - оценивать весь блок
+    :param workers: Количество потоков для cdist (-1 - все ядра)
+    :return: Кортеж (позиции строк поставщика, оценки), -1 если совпадения нет
+    """
+    choices = supplier_index.choices
+    all_suppliers = np.arange(len(choices))
+
+    positions = np.full(len(queries), -1, dtype=np.int64)
+    scores = np.zeros(len(queries), dtype=np.int64)
+
+    # Группы по типу продукта; строки без типа сравниваются со всем каталогом
+    groups = pd.Series(np.arange(len(queries))).groupby(
+        order_types, dropna=False, sort=False
+    )
+    for product_type, group in groups:
+        rows = group.to_numpy()
+        if pd.isna(product_type):
+            block = all_suppliers
+        else:
+            block = supplier_index.blocks.get(product_type)
+        if block is None or not len(block):
+            continue
+
+        if not candidates or candidates >= len(block):
+            best, best_scores = best_matches(
+                queries[rows].tolist(), choices[block].tolist(), workers=workers
+            )
+            found = best >= 0
+            positions[rows[found]] = block[best[found]]
+            scores[rows[found]] = best_scores[found]
+            continue
+
+        # Кандидаты идут в порядке каталога, поэтому при равных оценках
+        # выбирается та же строка, что и при полном переборе
+        token_index = supplier_index.token_index
+        for row in rows:
+            subset = token_index.candidates(queries[row], block, candidates)
+            best, best_scores = best_matches(
+                [queries[row]], choices[subset].tolist(), workers=workers
+            )
+            if best[0] >= 0:
+                positions[row] = subset[best[0]]
+                scores[row] = best_scores[0]
+
+    return positions, scores
+
+
+def candidate_recall(queries, order_types, supplier_index, candidates, workers=-1):
+    """
+    Доля совпадений полного перебора, найденных по кандидатам TokenIndex
+
+    :return: Кортеж (recall, найдено так же, совпадений полного перебора)
+    """
+    exact, _ = match_positions(queries, order_types, supplier_index, 0, workers)
+    indexed, _ = match_positions(
+        queries, order_types, supplier_index, candidates, workers
+    )
+    expected = exact >= 0
+    hits = int((indexed[expected] == exact[expected]).sum())
+    total = int(expected.sum())
+    return (hits / total if total else 1.0), hits, total
+
+
+class FuzzyMemo:
+    def __init__(self, max_size):
+        """
+        Результаты нечеткого поиска в пределах сессии.
+
+        (запрос, тип продукта) -> (позиция строки поставщика, оценка); при
+        переполнении вытесняются самые старые записи.
+
+        :param max_size: Максимальное количество записей, 0 - не хранить
+        """
+        self.max_size = max_size
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        if self.max_size <= 0:
+            return
+        if len(self.results) >= self.max_size:
+            del self.results[next(iter(self.results))]
+        self.results[key] = result
+
+
+def fuzzy_match_batched(
+    still_unmatched,
+    df_supplier,
+    workers=-1,
+    supplier_index=None,
+    candidates=0,
+    recall_sample=0,
+    memo=None,
+):
+    """
+    Нечеткое сопоставление блоками по типу продукта.
+
+    Несопоставленные строки группируются по product_type, каждая группа
+    оценивается против своего блока поставщика одной матрицей, либо только
+    против top-K кандидатов из TokenIndex.
+
+    :param still_unmatched: Несопоставленные строки заказа
+    :param df_supplier: Данные поставщика с атрибутами
+    :param workers: Количество потоков для cdist (-1 - все ядра)
+    :param supplier_index: Готовый SupplierIndex, иначе строится на лету
+    :param candidates: Количество кандидатов на запрос, 0 - полный перебор
+    :param recall_sample: Сколько запросов проверить полным перебором и
+        записать recall кандидатов в лог
+    :param memo: FuzzyMemo сессии; одинаковые запросы оцениваются один раз
+        и без него, memo переносит результаты между вызовами
+    :return: Список совпадений в порядке строк still_unmatched
+    """
+    if still_unmatched.empty or df_supplier.empty:
+        return []
+
+    memo = memo if memo is not None else FuzzyMemo(0)
+    if supplier_index is None:
+        supplier_index = SupplierIndex.build(df_supplier)
+
+    # Уникальные пары (текст, тип продукта) и позиция пары каждой строки
+    product_types = [
+        None if pd.isna(product_type) else product_type
+        for product_type in still_unmatched["product_type_order"]
+    ]
+    pairs = zip(still_unmatched["normalized_order"], product_types)
+    keys = {}
+    codes = np.fromiter(
+        (keys.setdefault(pair, len(keys)) for pair in pairs),
+        dtype=np.int64,
+        count=len(still_unmatched),
+    )
+    keys = list(keys)
+    positions = np.full(len(keys), -1, dtype=np.int64)
+    scores = np.zeros(len(keys), dtype=np.int64)
+    todo = []
+    for i, key in enumerate(keys):
+        result = memo.get(key)
+        if result is None:
+            todo.append(i)
+        else:
+            positions[i], scores[i] = result
+    todo = np.asarray(todo, dtype=np.int64)
+
+    queries = np.array([process_query(keys[i][0]) for i in todo], dtype=object)
+    order_types = np.array([keys[i][1] for i in todo], dtype=object)
+    positions[todo], scores[todo] = match_positions(
+        queries, order_types, supplier_index, candidates, workers
+    )
+    for i in todo:
+        memo.put(keys[i], (positions[i], scores[i]))
+
+    if candidates and recall_sample and len(queries):
+        sample = np.linspace(
+            0, len(queries) - 1, min(recall_sample, len(queries)), dtype=np.int64
+        )
+        recall, hits, total = candidate_recall(
+            queries[sample], order_types[sample], supplier_index, candidates, workers
+        )
+        logger.info(
+            "Fuzzy candidate recall: %.4f (%s of %s brute-force matches, k=%s)",
+            recall,
+            hits,
+            total,
+            candidates,
+        )
+
+    positions, scores = positions[codes], scores[codes]
+    found_rows = np.flatnonzero(positions >= 0)
+    orders = still_unmatched.iloc[found_rows]
+    suppliers = df_supplier.iloc[positions[found_rows]]
+    empty = [""] * len(found_rows)
+
+    return [
+        {
+            "Код ТМЦ": code,
+            "Название": name,
+            "product_code": product_code,
+            "size": size,
+            "color": color,
+            "Номенклатура": nomenclature,
+            "КИЗ": kiz,
+            "BOOK_ID": book_id,
+            "Метод": "Нечеткое",
+            "Уровень": int(score),
+        }
+        for code, name, product_code, size, color, nomenclature, kiz, book_id, score in zip(
+            orders["Код ТМЦ"],
+            orders["Название"],
+            orders["product_code"],
+            orders["size"],
+            orders["color_order"],
+            suppliers["Номенклатура"],
+            suppliers["КИЗ"] if "КИЗ" in suppliers else empty,
+            suppliers["BOOK_ID"] if "BOOK_ID" in suppliers else empty,
+            scores[found_rows],
+        )
+    ]
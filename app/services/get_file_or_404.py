@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 from fastapi import HTTPException
 from fastapi.responses import FileResponse
@@ -7,10 +7,12 @@ from fastapi.responses import FileResponse
 from app.core.logging import logger
 
 
-def get_file_or_404(file_path: Union[str, Path]) -> FileResponse:
+def get_file_or_404(
+    file_path: Union[str, Path], media_type: Optional[str] = None
+) -> FileResponse:
     """Return file or 404 error."""
     path = Path(file_path)
     if not path.exists():
         logger.error("File not found: %s", file_path)
         raise HTTPException(404, "File not found")
-    return FileResponse(path, filename=path.name)
+    return FileResponse(path, media_type=media_type, filename=path.name)
@@ -0,0 +1,619 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics
+from app.core.logging import logger
+from app.core.settings import settings
+from app.services import result_cache
+from app.services.catalog import version_path
+from app.services.matchproducts import (
+    MATCH_STAGES,
+    RESULT_NAME,
+    FileLoadError,
+    match_parse_plan,
+    match_products_post,
+    parse_file,
+)
+from app.services.profiling import PROFILE_DIR, PROFILE_FILES, SessionProfiler
+from app.services.remove_folder import remove_folder
+from app.services.save_uploaded_files import save_uploaded_files
+from app.services.warmup import warm_up_matching
+from app.services.writers import DEFAULT_FORMAT, result_path
+
+JOBS_DIR = settings.JOBS_DIR
+
+STATUS_FILE = "status.json"
+CANCEL_FILE = "cancel"
+INPUT_DIR = "input"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {DONE, FAILED, CANCELLED}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_futures: Dict[str, Future] = {}
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _write_status(job_dir: Path, status: dict) -> None:
+    """Atomically replace job status file."""
+    tmp_path = job_dir / f".{STATUS_FILE}"
+    tmp_path.write_text(json.dumps(status, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, job_dir / STATUS_FILE)
+
+
+def _read_status(job_dir: Path) -> dict:
+    return json.loads((job_dir / STATUS_FILE).read_text(encoding="utf-8"))
+
+
+def job_path(job_id: Union[str, uuid.UUID]) -> Path:
+    """Return job directory or 404 error."""
+    path = Path(JOBS_DIR) / str(job_id)
+    if not (path / STATUS_FILE).exists():
+        logger.error("Job not found: %s", job_id)
+        raise HTTPException(404, "Job not found")
+    return path
+
+
+def job_input_path(job_id: Union[str, uuid.UUID]) -> Path:
+    return Path(JOBS_DIR) / str(job_id) / INPUT_DIR
+
+
+def job_workers() -> int:
+    """Pool size: JOB_WORKERS, or the cores shared among server processes."""
+    if settings.JOB_WORKERS:
+        return settings.JOB_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(settings.SERVER_WORKERS, 1))
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Create the matching process pool on first use."""
+    global _executor
+    if _executor is None:
+        context = multiprocessing.get_context(settings.JOB_START_METHOD)
+        if settings.JOB_START_METHOD == "forkserver":
+            # Workers fork from a server that has already imported the pipeline
+            context.set_forkserver_preload([__name__])
+        _executor = ProcessPoolExecutor(
+            max_workers=job_workers(),
+            mp_context=context,
+            initializer=warm_up_matching,
+        )
+        logger.info("Job process pool started: %s workers", job_workers())
+    return _executor
+
+
+def start_workers() -> None:
+    """Start all pool processes now instead of on the first jobs."""
+    executor = get_executor()
+    for future in [executor.submit(os.getpid) for _ in range(job_workers())]:
+        future.result()
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _submit(fn, *args) -> Future:
+    """Submit to the pool; a pool that broke while idle is replaced once."""
+    try:
+        return get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        logger.error("Job process pool is broken, restarting it")
+        shutdown_executor()
+        return get_executor().submit(fn, *args)
+
+
+def parse_input(file_path: str, head: List[str], columns: List[str]) -> None:
+    """Parse one input file ahead; executed in a pool worker process.
+
+    A file that fails is left unparsed: the job reads it again and reports
+    the error with the file name.
+    """
+    try:
+        parse_file(file_path, head, columns)
+    except Exception as e:
+        logger.warning("Input file not parsed ahead: %s", e)
+
+
+def parse_ahead(plan: List[tuple]) -> None:
+    """Parse files of a parse_plan in the pool, LOAD_WORKERS at a time.
+
+    Each file is parsed by its own pool process, so parsing uses as many
+    cores as there are files; blocks until all files are parsed.
+    """
+    limit = settings.LOAD_WORKERS or job_workers()
+    pending = set()
+    for task in plan:
+        if len(pending) >= limit:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        pending.add(_submit(parse_input, *task))
+    wait(pending)
+
+
+class JobProgress:
+    def __init__(self, job_dir: Path):
+        """
+        Records stage progress of a running job into its status file.
+
+        :param job_dir: Job directory
+        """
+        self.job_dir = job_dir
+        self.status = _read_status(job_dir)
+
+    def __call__(self, stage: str) -> None:
+        if (self.job_dir / CANCEL_FILE).exists():
+            raise JobCancelledError(stage)
+
+        now = _now()
+        current = self.status.get("stage")
+        if stage == current:
+            return
+        if current:
+            self.status["stages"][current]["finished_at"] = now
+        self.status["stage"] = stage
+        self.status["stages"][stage] = {"started_at": now, "finished_at": None}
+        self.status["progress"] = round(
+            (len(self.status["stages"]) - 1) / len(MATCH_STAGES), 2
+        )
+        _write_status(self.job_dir, self.status)
+
+    def finish(self, state: str, **fields) -> dict:
+        now = _now()
+        current = self.status.get("stage")
+        if current and self.status["stages"][current]["finished_at"] is None:
+            self.status["stages"][current]["finished_at"] = now
+        self.status.update(state=state, finished_at=now, **fields)
+        if state == DONE:
+            self.status["progress"] = 1.0
+        _write_status(self.job_dir, self.status)
+        return self.status
+
+
+def _match(job_dir: Path, progress: JobProgress) -> Union[str, bytes]:
+    status = progress.status
+    match = partial(
+        match_products_post,
+        str(job_dir / INPUT_DIR),
+        status.get("catalog_id"),
+        progress=progress,
+        output_format=status.get("format", DEFAULT_FORMAT),
+        compression=status.get("compression"),
+        # Synchronous sessions get small results back without a file
+        memory_rows=settings.RESULT_MEMORY_ROWS if status.get("sync") else 0,
+        batch=status.get("batch", False),
+        catalog_version=status.get("catalog_version"),
+        stream=status.get("stream", False),
+    )
+    if not status.get("profile"):
+        return match()
+
+    profiler = SessionProfiler()
+    try:
+        with profiler:
+            return match()
+    finally:
+        try:
+            profiler.save(job_dir / PROFILE_DIR)
+        except OSError as e:
+            logger.error("Profile not saved %s: %s", job_dir.name, e)
+
+
+def run_job(job_dir: str) -> dict:
+    """Run matching for a job directory; executed in a pool worker process."""
+    job_dir = Path(job_dir)
+    progress = JobProgress(job_dir)
+    if (job_dir / CANCEL_FILE).exists():
+        return progress.finish(CANCELLED)
+
+    progress.status.update(state=RUNNING, started_at=_now(), pid=os.getpid())
+    _write_status(job_dir, progress.status)
+    # Stage timings go back to the server process inside the status
+    with metrics.record_run() as run:
+        try:
+            result = _match(job_dir, progress)
+        except JobCancelledError:
+            logger.info("Job cancelled: %s", job_dir.name)
+            return progress.finish(CANCELLED, metrics=run)
+        except FileLoadError as e:
+            logger.error("Job failed %s: %s", job_dir.name, str(e))
+            return progress.finish(
+                FAILED, error=str(e), file=e.file_name, metrics=run
+            )
+        except Exception as e:
+            logger.error("Job failed %s: %s", job_dir.name, str(e))
+            return progress.finish(
+                FAILED, error=f"{type(e).__name__}: {e}", metrics=run
+            )
+
+    status, content = progress.status, None
+    if isinstance(result, bytes):
+        content = result
+        result = result_path(RESULT_NAME, status["format"], status["compression"])
+    if status.get("cache_key"):
+        result_cache.store(status["cache_key"], result, content)
+
+    logger.info("Job completed: %s", job_dir.name)
+    if content is None:
+        return progress.finish(
+            DONE, result=str(Path(result).relative_to(job_dir)), metrics=run
+        )
+    # In-memory result goes back with the returned status, not into status.json
+    status = progress.finish(DONE, result=None, result_name=result.name, metrics=run)
+    return {**status, "content": content}
+
+
+def create_job(
+    catalog_id: Optional[str] = None,
+    output_format: str = DEFAULT_FORMAT,
+    compression: Optional[str] = None,
+    profile: bool = False,
+    sync: bool = False,
+    batch: bool = False,
+    catalog_version: Optional[int] = None,
+    stream: bool = False,
+) -> str:
+    """Create job directory and status file; input files go to job_input_path.
+
+    A sync job belongs to a request waiting for it: small results come back
+    in memory and the job is deleted once the response is sent. A batch job
+    matches each order file on its own and returns a zip archive. A stream
+    job appends NDJSON lines to stream_result_path while it runs. The job
+    matches against catalog_version even if the catalog is updated meanwhile.
+    """
+    remove_expired_jobs()
+
+    job_id = uuid.uuid4().hex
+    job_dir = Path(JOBS_DIR) / job_id
+    (job_dir / INPUT_DIR).mkdir(parents=True)
+    _write_status(
+        job_dir,
+        {
+            "job_id": job_id,
+            "state": QUEUED,
+            "catalog_id": catalog_id,
+            "catalog_version": catalog_version,
+            "format": output_format,
+            "compression": compression,
+            "profile": profile,
+            "sync": sync,
+            "batch": batch,
+            "stream": stream,
+            "server_pid": os.getpid(),
+            "created_at": _now(),
+            "stage": None,
+            "stages": {},
+            "progress": 0.0,
+        },
+    )
+    return job_id
+
+
+def _on_job_done(job_id: str, future: Future) -> None:
+    _futures.pop(job_id, None)
+    metrics.IN_FLIGHT.dec()
+    if future.cancelled():
+        return
+    if future.exception() is None:
+        status = future.result()
+        metrics.observe_run(status.get("metrics"))
+        if status["state"] == FAILED:
+            metrics.FAILURES.labels("job").inc()
+        elif status["state"] == DONE:
+            metrics.mark_startup("first_match")
+        return
+
+    metrics.FAILURES.labels("job").inc()
+
+    # Worker process died (e.g. killed by OOM) before writing the final status
+    global _executor
+    if isinstance(future.exception(), BrokenProcessPool):
+        _executor = None
+    logger.error("Job crashed %s: %s", job_id, future.exception())
+    job_dir = Path(JOBS_DIR) / job_id
+    if (job_dir / STATUS_FILE).exists():
+        status = _read_status(job_dir)
+        status.update(state=FAILED, finished_at=_now(), error=str(future.exception()))
+        _write_status(job_dir, status)
+
+
+def _copy_result(target: Future, source: Future) -> None:
+    if source.cancelled():
+        target.set_exception(CancelledError())
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def _parse_and_run(job_dir: Path, plan: List[tuple], future: Future) -> None:
+    """Parse job input files in the pool, then queue the job itself."""
+    try:
+        with metrics.STAGE_SECONDS.labels("parse_ahead").time():
+            parse_ahead(plan)
+    except Exception as e:
+        # The job parses its files itself
+        logger.error("Parsing ahead failed %s: %s", job_dir.name, e)
+    # A job cancelled meanwhile is not queued; once queued, it stops on
+    # the cancel file
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        _submit(run_job, str(job_dir)).add_done_callback(
+            partial(_copy_result, future)
+        )
+    except Exception as e:
+        future.set_exception(e)
+
+
+def submit_job(job_id: str) -> Future:
+    """Queue job for execution in the process pool.
+
+    Input files the job reads whole are first parsed by separate pool
+    processes (match_parse_plan), from a thread of the server process.
+    A pool that broke while idle or during warm-up, with no job to notice,
+    is replaced once.
+    """
+    job_dir = job_path(job_id)
+    status = _read_status(job_dir)
+    plan = match_parse_plan(
+        str(job_dir / INPUT_DIR),
+        status["catalog_id"],
+        batch=status.get("batch", False),
+        stream=status.get("stream", False),
+    )
+    if plan:
+        future = Future()
+        threading.Thread(
+            target=_parse_and_run, args=(job_dir, plan, future), daemon=True
+        ).start()
+    else:
+        future = _submit(run_job, str(job_dir))
+    metrics.IN_FLIGHT.inc()
+    _futures[job_id] = future
+    future.add_done_callback(partial(_on_job_done, job_id))
+    logger.info("Job submitted: %s", job_id)
+    return future
+
+
+async def start_job(
+    files: List[UploadFile],
+    catalog_id: Optional[str] = None,
+    output_format: str = DEFAULT_FORMAT,
+    compression: Optional[str] = None,
+    profile: bool = False,
+    sync: bool = False,
+    batch: bool = False,
+    stream: bool = False,
+) -> Tuple[str, Future]:
+    """Save uploaded files into a new job and queue it."""
+    if not files:
+        raise HTTPException(400, "No files provided")
+
+    catalog_version = None
+    if catalog_id:
+        # Catalog updates after submission do not change this job's result
+        _, catalog_version = version_path(catalog_id)
+
+    job_id = create_job(
+        catalog_id,
+        output_format,
+        compression,
+        profile,
+        sync,
+        batch,
+        catalog_version,
+        stream,
+    )
+    try:
+        try:
+            with metrics.STAGE_SECONDS.labels("upload").time():
+                await save_uploaded_files(files, job_input_path(job_id))
+        except Exception:
+            metrics.FAILURES.labels("upload").inc()
+            raise
+        # A profiled session has to run even if its result is cached
+        if result_cache.enabled() and not profile:
+            cached = await run_in_threadpool(_use_cached_result, job_id)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+                return job_id, future
+    except Exception:
+        delete_job(job_id)
+        raise
+
+    return job_id, submit_job(job_id)
+
+
+def _use_cached_result(job_id: str) -> Optional[dict]:
+    """Finish job with a cached result, or record its cache key for run_job."""
+    job_dir = job_path(job_id)
+    status = _read_status(job_dir)
+    status["cache_key"] = result_cache.result_key(
+        (job_dir / INPUT_DIR).iterdir(),
+        {
+            "catalog_id": status["catalog_id"],
+            "catalog_version": status.get("catalog_version"),
+            "format": status["format"],
+            "compression": status["compression"],
+            "batch": status.get("batch", False),
+            "stream": status.get("stream", False),
+            "fuzzy_engine": settings.FUZZY_ENGINE,
+            "fuzzy_candidates": settings.FUZZY_CANDIDATES,
+        },
+    )
+    cached = result_cache.fetch(status["cache_key"], job_dir)
+    if cached is None:
+        _write_status(job_dir, status)
+        return None
+
+    now = _now()
+    status.update(
+        state=DONE,
+        started_at=now,
+        finished_at=now,
+        progress=1.0,
+        cached=True,
+        result=str(cached.relative_to(job_dir)),
+    )
+    _write_status(job_dir, status)
+    logger.info("Job served from result cache: %s", job_id)
+    return status
+
+
+def get_job(job_id: Union[str, uuid.UUID]) -> dict:
+    """Return job status or 404 error."""
+    return _read_status(job_path(job_id))
+
+
+def cancel_job(job_id: Union[str, uuid.UUID]) -> dict:
+    """Cancel queued job at once, or ask a running job to stop at next stage."""
+    job_dir = job_path(job_id)
+    status = _read_status(job_dir)
+    if status["state"] in FINISHED:
+        return status
+
+    (job_dir / CANCEL_FILE).touch()
+    future = _futures.get(str(job_id))
+    if future is not None and future.cancel():
+        status.update(state=CANCELLED, finished_at=_now())
+        _write_status(job_dir, status)
+    logger.info("Job cancel requested: %s", job_id)
+    return status
+
+
+def job_result_path(job_id: Union[str, uuid.UUID]) -> Path:
+    """Return result file of a finished job or 409 error."""
+    job_dir = job_path(job_id)
+    status = _read_status(job_dir)
+    if status["state"] != DONE:
+        raise HTTPException(409, f"Job is {status['state']}")
+    if status["result"] is None:
+        raise HTTPException(404, "Result was returned with the response")
+    return job_dir / status["result"]
+
+
+def stream_result_path(job_id: Union[str, uuid.UUID]) -> Path:
+    """File a running stream job appends its NDJSON result to."""
+    return result_path(job_input_path(job_id) / RESULT_NAME, "ndjson")
+
+
+def job_profile_path(job_id: Union[str, uuid.UUID], kind: str = "text") -> Path:
+    """Return profile report file of a finished profiled job."""
+    job_dir = job_path(job_id)
+    status = _read_status(job_dir)
+    if not status.get("profile"):
+        raise HTTPException(404, "Job was not profiled")
+    if status["state"] not in FINISHED:
+        raise HTTPException(409, f"Job is {status['state']}")
+    if kind not in PROFILE_FILES:
+        raise HTTPException(
+            400, f"Only {sorted(PROFILE_FILES)} profile kinds supported"
+        )
+    return job_dir / PROFILE_DIR / PROFILE_FILES[kind][0]
+
+
+def delete_job(job_id: Union[str, uuid.UUID]) -> None:
+    remove_folder(Path(JOBS_DIR) / str(job_id))
+
+
+def remove_expired_jobs() -> None:
+    """Remove finished jobs older than JOB_RETENTION seconds."""
+    root = Path(JOBS_DIR)
+    if not root.exists():
+        return
+    deadline = time.time() - settings.JOB_RETENTION
+    for status_file in root.glob(f"*/{STATUS_FILE}"):
+        try:
+            expired = status_file.stat().st_mtime < deadline
+            if expired and _read_status(status_file.parent)["state"] in FINISHED:
+                remove_folder(status_file.parent)
+        except (OSError, ValueError):
+            continue
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_orphaned_results() -> None:
+    """Remove results left behind by server processes that are gone.
+
+    These are jobs of synchronous requests, deleted after the response
+    unless profiled, and results_* directories of the old per-request layout.
+    """
+    removed = 0
+    for folder in Path(settings.DATA_DIR).glob("results_*"):
+        if folder.is_dir():
+            remove_folder(folder)
+            removed += 1
+
+    for status_file in Path(JOBS_DIR).glob(f"*/{STATUS_FILE}"):
+        try:
+            status = _read_status(status_file.parent)
+        except (OSError, ValueError):
+            continue
+        orphaned = status.get("sync") and not status.get("profile")
+        if orphaned and not _pid_alive(status.get("server_pid")):
+            remove_folder(status_file.parent)
+            removed += 1
+    if removed:
+        logger.info("Removed %s orphaned results", removed)
+
+
+def fail_interrupted_jobs() -> None:
+    """Mark unfinished jobs whose server process is gone as failed."""
+    root = Path(JOBS_DIR)
+    if not root.exists():
+        return
+    for status_file in root.glob(f"*/{STATUS_FILE}"):
+        try:
+            status = _read_status(status_file.parent)
+        except (OSError, ValueError):
+            continue
+        if status["state"] not in FINISHED and not _pid_alive(
+            status.get("server_pid")
+        ):
+            status.update(state=FAILED, finished_at=_now(), error="Interrupted")
+            _write_status(status_file.parent, status)
@@ -1,16 +1,86 @@
+import json
 import os
 import re
+import tempfile
+import time
+import zipfile
+import zlib
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from fuzzywuzzy import fuzz, process
 
+from app.core import metrics
 from app.core.logging import logger
+from app.core.settings import settings
+from app.services.attributes import (
+    extract_attributes_frame,
+    normalize_texts,
+    unique_texts,
+)
+from app.services.arrow_safe import mixed_columns
+from app.services.catalog import get_catalog, save_catalog, update_catalog
+from app.services.compact import compact_frame, plain_frame
+from app.services.exactmatch import ExactIndex
+from app.services.fuzzymatch import FuzzyMemo, SupplierIndex, fuzzy_match_batched
 from app.services.read_excel_f import FileFinder, HeaderFinder
+from app.services.writers import (
+    DEFAULT_FORMAT,
+    TEXT_FORMATS,
+    ResultWriter,
+    encode_result,
+    result_path,
+    write_result,
+)
+
+# Столбцы для поиска шапки файлов заказов и поставщика
+ORDER_HEAD = ["№", "Код ТМЦ", "Название", "Кол-во", "Цена", "Сумма"]
+SUPPLIER_HEAD = ["Номенклатура", "BOOK_ID", "КИЗ"]
+# Столбцы заказа, которые читаются из файла
+ORDER_COLUMNS = ["Код ТМЦ", "Название"]
+
+# Этапы match_products_post в порядке выполнения (передаются в progress)
+MATCH_STAGES = ["load_orders", "load_suppliers", "exact_match", "fuzzy_match", "write"]
+# Столбцы результата до переименования в format_result
+RESULT_COLUMNS = [
+    "Код ТМЦ",
+    "Название",
+    "product_code",
+    "size",
+    "color",
+    "Номенклатура",
+    "КИЗ",
+    "BOOK_ID",
+    "Метод",
+    "Уровень",
+]
+# Имя файла результатов без расширения
+RESULT_NAME = "matched_results"
+# Директория рядом с загруженными файлами для результатов parse_file
+PARSED_DIR = ".parsed"
+# Лист сводки пакетного сопоставления (match_batch)
+SUMMARY_NAME = "summary"
+SUMMARY_METHODS = ["Артикул и размер", "Артикул и цвет", "Артикул", "Нечеткое"]
+
+
+class FileLoadError(Exception):
+    def __init__(self, file_name: str, reason: str):
+        """Ошибка чтения одного из загруженных файлов"""
+        super().__init__(file_name, reason)
+        self.file_name = file_name
+        self.reason = reason
+
+    def __str__(self):
+        return f"Failed to read {self.file_name}: {self.reason}"
+
+
+def _no_progress(stage):
+    pass
 
 
 def normalize_text(text):
-    """Нормализация текста для сравнения"""
+    """Нормализация текста для сравнения (построчный вариант normalize_texts)"""
     text = str(text).lower()
     text = re.sub(r"[^\w\s/-]", " ", text)  # Удаляем спецсимволы
     text = re.sub(r"\s+", " ", text).strip()  # Удаляем лишние пробелы
@@ -18,7 +88,7 @@ def normalize_text(text):
 
 
 def extract_attributes(text):
-    """Извлечение атрибутов из названия товара"""
+    """Извлечение атрибутов из названия товара (построчный вариант extract_attributes_frame)"""
     text = str(text).lower()
 
     # 1. Тип продукта (первое слово)
@@ -89,117 +159,258 @@ def extract_attributes(text):
     }
 
 
-def match_products(df_order, df_supplier):
-    """Основная функция сопоставления товаров"""
+def fuzzy_match_legacy(still_unmatched, df_supplier):
+    """Построчное нечеткое сопоставление через fuzzywuzzy (исходный вариант)"""
+    matches = []
+    for _, row in still_unmatched.iterrows():
+        supplier_subset = (
+            df_supplier[df_supplier["product_type"] == row["product_type_order"]]
+            if pd.notna(row["product_type_order"])
+            else df_supplier
+        )
+
+        if len(supplier_subset) > 0:
+            # Словарь позиция -> строка: extractOne возвращает ключ, а метки
+            # индекса после объединения файлов могут повторяться
+            best_match = process.extractOne(
+                row["normalized_order"],
+                dict(enumerate(supplier_subset["normalized"])),
+                scorer=fuzz.token_set_ratio,
+                score_cutoff=90,
+            )
+            if best_match:
+                best_match_row = supplier_subset.iloc[best_match[2]]
+                matches.append(
+                    {
+                        "Код ТМЦ": row["Код ТМЦ"],
+                        "Название": row["Название"],
+                        "product_code": row["product_code"],
+                        "size": row["size"],
+                        "color": row["color_order"],
+                        "Номенклатура": best_match_row["Номенклатура"],
+                        "КИЗ": best_match_row.get("КИЗ", ""),
+                        "BOOK_ID": best_match_row.get("BOOK_ID", ""),
+                        "Метод": "Нечеткое",
+                        "Уровень": best_match[1],
+                    }
+                )
+    return matches
+
 
-    # Нормализация текста
-    df_order["normalized"] = df_order["Название"].apply(normalize_text)
-    df_supplier["normalized"] = df_supplier["Номенклатура"].apply(normalize_text)
+def report_dedup(kind, total, unique, seconds):
+    """
+    Доля повторов среди строк и оценка сэкономленного на них времени
 
-    # Извлечение атрибутов
-    order_attrs = df_order["Название"].apply(extract_attributes).apply(pd.Series)
-    supplier_attrs = (
-        df_supplier["Номенклатура"].apply(extract_attributes).apply(pd.Series)
+    :param kind: Вид строк (orders, suppliers, fuzzy)
+    :param total: Количество строк
+    :param unique: Сколько из них обработано
+    :param seconds: Время обработки unique строк
+    """
+    metrics.add_dedup(kind, total, unique)
+    if total:
+        saved = seconds * (total - unique) / unique if unique else 0.0
+        logger.info(
+            f"Dedup {kind}: {total} texts, {unique} processed "
+            f"({unique / total:.0%}), ~{saved:.2f}s saved"
+        )
+
+
+def prepare_texts(df, column, kind):
+    """
+    Нормализация и атрибуты столбца текста
+
+    Каждая уникальная строка обрабатывается один раз, результат
+    размножается на все строки с тем же текстом.
+
+    :return: Кортеж (нормализованный текст, DataFrame атрибутов)
+    """
+    start = time.perf_counter()
+    with metrics.stage("normalize"):
+        texts, codes = unique_texts(df[column])
+        normalized = normalize_texts(texts).take(codes).set_axis(df.index)
+    with metrics.stage("extract"):
+        attrs = extract_attributes_frame(texts).take(codes).set_axis(df.index)
+    report_dedup(kind, len(codes), len(texts), time.perf_counter() - start)
+    return normalized, attrs
+
+
+def prepare_order(df_order):
+    """Нормализация и извлечение атрибутов строк заказа (компактные типы)"""
+    df_order["normalized"], order_attrs = prepare_texts(
+        df_order, "Название", "orders"
     )
+    with metrics.stage("extract"):
+        df_order = compact_frame(pd.concat([df_order, order_attrs], axis=1))
+    metrics.add_memory("extract", df_order)
+    return df_order
+
+
+def prepare_supplier(df_supplier):
+    """Нормализация и извлечение атрибутов каталога поставщика (компактные типы)"""
+    df_supplier["normalized"], supplier_attrs = prepare_texts(
+        df_supplier, "Номенклатура", "suppliers"
+    )
+    with metrics.stage("extract"):
+        df_supplier = compact_frame(pd.concat([df_supplier, supplier_attrs], axis=1))
+    metrics.add_memory("extract", df_supplier)
+    return df_supplier
+
 
-    df_order = pd.concat([df_order, order_attrs], axis=1)
-    df_supplier = pd.concat([df_supplier, supplier_attrs], axis=1)
+def match_products(df_order, df_supplier, fuzzy_engine=None):
+    """
+    Основная функция сопоставления товаров
 
-    # 1. Точное совпадение по артикулу и размеру
-    merged = pd.merge(
-        df_order,
-        df_supplier,
-        on=["product_code", "size"],
-        how="left",
-        suffixes=("_order", "_supplier"),
+    :param fuzzy_engine: "batched" (по умолчанию) или "legacy" для построчного
+        сопоставления через fuzzywuzzy
+    """
+    return match_prepared(
+        prepare_order(df_order), prepare_supplier(df_supplier), fuzzy_engine
     )
 
-    # 2. Для несопоставленных - совпадение по артикулу
-    unmatched = merged[merged["Номенклатура"].isna()].copy()
-    if not unmatched.empty:
-        #     temp_merged = pd.merge(
-        #         unmatched[['Код ТМЦ', 'Название', 'product_code', 'size', 'color_order', 'normalized_order']],
-        #         df_supplier,
-        #         left_on='product_code',
-        #         right_on='product_code',
-        #         how='left'
-        #     )
-        temp_merged = unmatched[
-            [
-                "Код ТМЦ",
-                "Название",
-                "product_code",
-                "size",
-                "color_order",
-                "normalized_order",
-            ]
-        ]
-
-        merged = pd.concat(
-            [merged[~merged["Номенклатура"].isna()], temp_merged], ignore_index=True
+
+def match_prepared(
+    df_order, df_supplier, fuzzy_engine=None, supplier_index=None, progress=None
+):
+    """
+    Сопоставление подготовленных заказа и каталога поставщика
+
+    :param fuzzy_engine: "batched" (по умолчанию) или "legacy"
+    :param supplier_index: Готовый SupplierIndex каталога (например, из
+        сохранённого каталога), иначе строится на лету
+    :param progress: Необязательная функция progress(stage), вызывается
+        перед каждым этапом
+    """
+    metrics.add_rows("orders", len(df_order))
+    metrics.add_rows("suppliers", len(df_supplier))
+    exact, fuzzy = match_parts(
+        df_order, df_supplier, fuzzy_engine, supplier_index, progress
+    )
+    return join_parts(exact, fuzzy)
+
+
+def join_parts(exact, fuzzy):
+    """Объединение и форматирование частей результата match_parts"""
+    if fuzzy is None:
+        return format_result(exact)
+    # Части с одинаковыми (object) типами: иначе тип столбца, пустого в
+    # нечетких совпадениях, зависит от устаревшего поведения pd.concat
+    return format_result(pd.concat([plain_frame(exact), fuzzy], ignore_index=True))
+
+
+def match_parts(
+    df_order,
+    df_supplier,
+    fuzzy_engine=None,
+    supplier_index=None,
+    progress=None,
+    exact_index=None,
+    fuzzy_memo=None,
+):
+    """
+    Точное и нечеткое сопоставление без форматирования результата
+
+    Параметры как у match_prepared.
+
+    :param exact_index: Готовый ExactIndex каталога, иначе строится на лету
+    :param fuzzy_memo: FuzzyMemo сессии, общий для нескольких вызовов
+    :return: Кортеж (строки точного совпадения, DataFrame нечетких
+        совпадений или None, если их нет)
+    """
+    progress = progress or _no_progress
+
+    progress("exact_match")
+    exact, still_unmatched = match_exact(df_order, df_supplier, exact_index)
+
+    progress("fuzzy_match")
+    fuzzy = match_fuzzy(
+        still_unmatched, df_supplier, fuzzy_engine, supplier_index, fuzzy_memo
+    )
+    return exact, fuzzy
+
+
+def match_exact(df_order, df_supplier, exact_index=None):
+    """
+    Каскад точных совпадений: артикул и размер, артикул и цвет, артикул
+
+    :param exact_index: Готовый ExactIndex каталога, иначе строится на лету
+    :return: Кортеж (строки точного совпадения, несопоставленные строки
+        заказа для match_fuzzy)
+    """
+    # Столбцы заказа, которые есть и в каталоге, получают суффикс _order,
+    # как при слиянии полных таблиц
+    order_columns = {
+        col: f"{col}_order"
+        for col in df_order.columns
+        if col in df_supplier.columns and col not in ("product_code", "size")
+    }
+    supplier_columns = [
+        col for col in ["Номенклатура", "КИЗ", "BOOK_ID"] if col in df_supplier.columns
+    ]
+
+    with metrics.stage("exact_match"):
+        if exact_index is None:
+            exact_index = ExactIndex(df_supplier)
+        positions, methods = exact_index.match(df_order)
+        found = positions >= 0
+        orders = df_order.rename(columns=order_columns)
+        exact = orders.iloc[np.flatnonzero(found)].reset_index(drop=True)
+        exact[supplier_columns] = (
+            df_supplier[supplier_columns].iloc[positions[found]].reset_index(drop=True)
         )
+        if "color_order" in exact:
+            exact["color"] = exact["color_order"]
+        exact["Метод"] = methods[found]
+    metrics.add_memory("exact_match", exact)
+    return exact, orders.iloc[np.flatnonzero(~found)]
 
-    # 3. Для оставшихся - fuzzy matching
-    still_unmatched = merged[merged["Номенклатура"].isna()].copy()
-    if not still_unmatched.empty:
-        matches = []
-        for _, row in still_unmatched.iterrows():
-            supplier_subset = (
-                df_supplier[df_supplier["product_type"] == row["product_type_order"]]
-                if pd.notna(row["product_type_order"])
-                else df_supplier
-            )
 
-            if len(supplier_subset) > 0:
-                best_match = process.extractOne(
-                    row["normalized_order"],
-                    supplier_subset["normalized"],
-                    scorer=fuzz.token_set_ratio,
-                    score_cutoff=90,
-                )
-                if best_match:
-                    best_match_row = supplier_subset.iloc[best_match[2]]
-                    matches.append(
-                        {
-                            "Код ТМЦ": row["Код ТМЦ"],
-                            "Название": row["Название"],
-                            "product_code": row["product_code"],
-                            "size": row["size"],
-                            "color": row["color_order"],
-                            "Номенклатура": best_match_row["Номенклатура"],
-                            "КИЗ": best_match_row.get("КИЗ", ""),
-                            "BOOK_ID": best_match_row.get("BOOK_ID", ""),
-                            "Метод": "Нечеткое",
-                            "Уровень": best_match[1],
-                        }
-                    )
+def match_fuzzy(
+    still_unmatched,
+    df_supplier,
+    fuzzy_engine=None,
+    supplier_index=None,
+    fuzzy_memo=None,
+):
+    """
+    Нечеткое сопоставление строк, не найденных match_exact
 
-        if matches:
-            matches_df = pd.DataFrame(matches)
-            final = pd.concat(
-                [merged[~merged["Номенклатура"].isna()], matches_df], ignore_index=True
-            )
+    :param fuzzy_engine: "batched" (по умолчанию) или "legacy"
+    :param supplier_index: Готовый SupplierIndex каталога
+    :param fuzzy_memo: FuzzyMemo сессии, общий для нескольких вызовов
+    :return: DataFrame нечетких совпадений или None, если их нет
+    """
+    fuzzy_engine = fuzzy_engine or settings.FUZZY_ENGINE
+    if still_unmatched.empty:
+        return None
+    with metrics.stage("fuzzy_match"):
+        if fuzzy_engine == "legacy":
+            matches = fuzzy_match_legacy(still_unmatched, df_supplier)
         else:
-            final = merged[~merged["Номенклатура"].isna()].copy()
-    else:
-        final = merged
-
-    # Форматирование результата
-    result_cols = [
-        "Код ТМЦ",
-        "Название",
-        "product_code",
-        "size",
-        "color",
-        "Номенклатура",
-        "КИЗ",
-        "BOOK_ID",
-        "Метод",
-        "Уровень",
-    ]
+            if fuzzy_memo is None:
+                fuzzy_memo = FuzzyMemo(settings.FUZZY_MEMO_SIZE)
+            misses, start = fuzzy_memo.misses, time.perf_counter()
+            matches = fuzzy_match_batched(
+                still_unmatched,
+                df_supplier,
+                workers=settings.FUZZY_WORKERS,
+                supplier_index=supplier_index,
+                candidates=settings.FUZZY_CANDIDATES,
+                recall_sample=settings.FUZZY_RECALL_SAMPLE,
+                memo=fuzzy_memo,
+            )
+            report_dedup(
+                "fuzzy",
+                len(still_unmatched),
+                fuzzy_memo.misses - misses,
+                time.perf_counter() - start,
+            )
+    return pd.DataFrame(matches) if matches else None
+
 
-    result = (
-        final[[col for col in result_cols if col in final.columns]]
+def result_frame(final):
+    """Выбор и переименование столбцов результата"""
+    return (
+        plain_frame(final[[col for col in RESULT_COLUMNS if col in final.columns]])
         .rename(
             columns={
                 "product_code": "Артикул",
@@ -211,80 +422,709 @@ def match_products(df_order, df_supplier):
         .fillna("")
     )
 
+
+def format_result(final):
+    """Столбцы результата result_frame с учётом методов и памяти в метриках"""
+    result = result_frame(final)
+    if "Метод" in result:
+        metrics.add_methods(result["Метод"])
+    metrics.add_memory("write", result)
+
     return result
 
 
-def match_products_post(files_dir: str):
+def match_records(orders, suppliers=None, catalog_id=None):
+    """
+    Сопоставление строк заказа без чтения и записи Excel
 
-    dir_rep = FileFinder(files_dir)
+    :param orders: Список словарей со столбцами ORDER_COLUMNS
+    :param suppliers: Список словарей со столбцами SUPPLIER_HEAD
+    :param catalog_id: Идентификатор сохранённого каталога вместо suppliers
+    :return: Список словарей со столбцами результата match_prepared
+    """
+    df_order = prepare_order(pd.DataFrame(orders, columns=ORDER_COLUMNS))
+    if catalog_id:
+        df_supplier, supplier_index = get_catalog(catalog_id)
+    else:
+        df_supplier = prepare_supplier(pd.DataFrame(suppliers, columns=SUPPLIER_HEAD))
+        supplier_index = None
 
-    # по части строки ищем по части названия это файл с заказами или кодами,
-    # создаем список с названиями столбцов для поиска шапки по названию колонок,
-    # создаем копию класса для поиска шапки
-    supppliers_files = dir_rep.find_files_by_partial_name("код")
-    supplier_head = ["Номенклатура", "BOOK_ID", "КИЗ"]
-    supHeaderFinder = HeaderFinder
+    result = match_prepared(df_order, df_supplier, supplier_index=supplier_index)
+    return result.to_dict(orient="records")
 
-    order_files = dir_rep.find_files_by_partial_name("заказ")
-    order_head = ["№", "Код ТМЦ", "Название", "Кол-во", "Цена", "Сумма"]
-    ordHeaderFinder = HeaderFinder
+
+def read_file(file_path, head, columns):
+    """
+    Чтение одного файла; ошибка содержит имя файла
+
+    :param file_path: Путь к файлу Excel
+    :param head: Столбцы для поиска шапки
+    :param columns: Столбцы, которые читаются из файла
+    :return: DataFrame со столбцами columns
+    """
     try:
-        # Загрузка данных
+        return HeaderFinder(file_path, head).to_dataframe(columns)
+    except Exception as e:
+        raise FileLoadError(
+            os.path.basename(file_path), f"{type(e).__name__}: {e}"
+        ) from e
 
-        df_order = pd.concat(
-            [
-                ordHeaderFinder(f, order_head).to_dataframe()[["Код ТМЦ", "Название"]]
-                for f in order_files
-            ]
-        )
-        df_supplier = pd.concat(
-            [
-                supHeaderFinder(f, supplier_head).to_dataframe()[supplier_head]
-                for f in supppliers_files
-            ]
+
+def parsed_path(file_path, head, columns):
+    """Путь к DataFrame файла, заранее разобранного parse_file"""
+    key = zlib.crc32(repr((head, columns)).encode())
+    path = Path(file_path)
+    return path.parent / PARSED_DIR / f"{path.name}.{key:08x}.pkl"
+
+
+def parse_file(file_path, head, columns):
+    """
+    Разбор файла заранее, в отдельном процессе
+
+    load_files возьмёт сохранённый DataFrame вместо повторного разбора.
+
+    :param file_path: Путь к файлу Excel
+    :param head: Столбцы для поиска шапки
+    :param columns: Столбцы, которые читаются из файла
+    """
+    df = read_file(file_path, head, columns)
+    path = parsed_path(file_path, head, columns)
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}")
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def parse_plan(order_files=(), supplier_files=()):
+    """
+    Задачи parse_file для файлов заказов и поставщика
+
+    Разбор openpyxl и xlrd занимает одно ядро, поэтому файлы разбираются
+    в разных процессах. Если файлов меньше двух или их общий размер меньше
+    LOAD_PARALLEL_MIN_SIZE, задач нет: файлы разбирает load_files.
+
+    :return: Список аргументов parse_file (путь, шапка, столбцы)
+    """
+    plan = [(f, ORDER_HEAD, ORDER_COLUMNS) for f in sorted(order_files)]
+    plan += [(f, SUPPLIER_HEAD, SUPPLIER_HEAD) for f in sorted(supplier_files)]
+    size = sum(os.path.getsize(f) for f, _, _ in plan)
+    if len(plan) < 2 or size < settings.LOAD_PARALLEL_MIN_SIZE:
+        return []
+    return plan
+
+
+def match_parse_plan(files_dir, catalog_id=None, batch=False, stream=False):
+    """Задачи parse_plan для файлов, которые match_products_post читает целиком"""
+    dir_rep = FileFinder(files_dir)
+    order_files = []
+    # В блочном режиме заказ читается блоками при сопоставлении
+    if stream or batch or not settings.MATCH_CHUNK_SIZE:
+        order_files = dir_rep.find_files_by_partial_name("заказ")
+    supplier_files = []
+    if not catalog_id:
+        supplier_files = dir_rep.find_files_by_partial_name("код")
+    return parse_plan(order_files, supplier_files)
+
+
+def catalog_parse_plan(files_dir):
+    """Задачи parse_plan для файлов build_catalog и update_catalog_files"""
+    supplier_files = FileFinder(files_dir).find_files_by_extension("xls")
+    return parse_plan(supplier_files=supplier_files)
+
+
+def _load_file(file_path, head, columns):
+    path = parsed_path(file_path, head, columns)
+    if path.exists():
+        return pd.read_pickle(path)
+    return read_file(file_path, head, columns)
+
+
+def load_files(files, head, columns):
+    """
+    Загрузка и объединение файлов
+
+    Файлы объединяются в порядке имён. Файл, уже разобранный parse_file,
+    читается готовым, остальные разбираются здесь. pd.concat не сохраняет
+    df.attrs файлов (строка шапки и буквы столбцов), поэтому они пишутся
+    в лог и в метрики сессии (статус задачи).
+
+    :param files: Пути к файлам Excel
+    :param head: Столбцы для поиска шапки
+    :param columns: Столбцы, которые читаются из файла
+    :return: Объединённый DataFrame
+    """
+    with metrics.stage("parse"):
+        frames = [_load_file(f, head, columns) for f in sorted(files)]
+        sources = [frame.attrs for frame in frames]
+        df = pd.concat(frames)
+    for source in sources:
+        logger.info(
+            "Header of %s: row %s, columns %s",
+            source["file"],
+            source["header_row"],
+            source["columns"],
         )
+    metrics.add_sources(sources)
+    metrics.add_memory("parse", df)
+    return df
+
+
+def load_orders(order_files):
+    """Загрузка и объединение файлов заказов"""
+    return load_files(order_files, ORDER_HEAD, ORDER_COLUMNS)
+
+
+def load_suppliers(supplier_files):
+    """Загрузка и объединение файлов поставщика"""
+    return load_files(supplier_files, SUPPLIER_HEAD, SUPPLIER_HEAD)
+
+
+def iter_orders(order_files, chunk_size):
+    """
+    Чтение файлов заказов блоками по chunk_size строк в порядке имён
+
+    :return: Генератор DataFrame со столбцами ORDER_COLUMNS
+    """
+    for file_path in sorted(order_files):
+        try:
+            yield from HeaderFinder(file_path, ORDER_HEAD).iter_chunks(
+                ORDER_COLUMNS, chunk_size
+            )
+        except Exception as e:
+            raise FileLoadError(
+                os.path.basename(file_path), f"{type(e).__name__}: {e}"
+            ) from e
 
-        # Сопоставление товаров
-        matched_products = match_products(df_order, df_supplier)
-        result_dir = os.path.join(files_dir, "matched_results.xlsx")
-        # Сохранение результатов
-        matched_products.to_excel(result_dir, index=False)
-        if Path(result_dir).exists():
-            logger.info(f"File {result_dir} succesfuly created")
-        logger.info(f"Matching complete. Matches: {len(matched_products)}.")
-        logger.info(f"Results saved into {result_dir}")
 
+def _common_dtype(dtypes):
+    """Тип столбца после pd.concat частей с типами dtypes"""
+    dtypes = list(dict.fromkeys(dtypes))
+    if len(dtypes) == 1:
+        return dtypes[0]
+    if all(isinstance(dtype, np.dtype) and dtype.kind in "iuf" for dtype in dtypes):
+        return np.result_type(*dtypes)
+    return np.dtype(object)
+
+
+def _with_missing(dtype):
+    """Тип столбца, в который pd.concat добавил пропуски"""
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        return np.dtype("float64")
+    if isinstance(dtype, np.dtype) and dtype.kind == "b":
+        return np.dtype(object)
+    return dtype
+
+
+class ResultSpool:
+    def __init__(self, spool_dir):
+        """
+        Части результата блочного сопоставления на диске
+
+        Части отдаются в порядке match_prepared (сначала все точные
+        совпадения, затем нечеткие) и приводятся к типам столбцов, которые
+        получило бы их объединение, поэтому format_result даёт те же
+        значения, что и в однопроходном режиме.
+
+        :param spool_dir: Временная директория для частей
+        """
+        self.spool_dir = Path(spool_dir)
+        self.parts = {"exact": [], "fuzzy": []}
+        self.dtypes = {"exact": {}, "fuzzy": {}}
+        self.rows = {"exact": 0, "fuzzy": 0}
+        self.na_columns = set()
+
+    def add(self, kind, part):
+        """
+        :param kind: "exact" или "fuzzy"
+        :param part: Часть результата match_parts
+        """
+        part = plain_frame(part[[col for col in RESULT_COLUMNS if col in part.columns]])
+        path = self.spool_dir / f"{kind}_{len(self.parts[kind])}.pkl"
+        part.to_pickle(path)
+        self.parts[kind].append(path)
+        # Пустая часть точных совпадений тоже несёт тип столбцов слияния
+        for column, dtype in part.dtypes.items():
+            self.dtypes[kind].setdefault(column, []).append(dtype)
+        self.rows[kind] += len(part)
+        self.na_columns.update(part.columns[part.isna().any()].tolist())
+
+    def _columns(self):
+        """Столбцы и их типы в объединении частей"""
+        exact = {
+            column: _common_dtype(dtypes)
+            for column, dtypes in self.dtypes["exact"].items()
+        }
+        if not self.rows["fuzzy"]:
+            return exact
+        fuzzy = {
+            column: _common_dtype(dtypes)
+            for column, dtypes in self.dtypes["fuzzy"].items()
+        }
+        if not self.rows["exact"]:
+            return {**exact, **fuzzy}
+
+        columns = {}
+        for column in {**exact, **fuzzy}:
+            if column in exact and column in fuzzy:
+                columns[column] = _common_dtype([exact[column], fuzzy[column]])
+            else:
+                columns[column] = _with_missing(exact.get(column, fuzzy.get(column)))
+                self.na_columns.add(column)
+        return columns
+
+    def frames(self, format_part=format_result):
+        """
+        Отформатированные части результата в порядке записи
+
+        :param format_part: Функция оформления части (format_result)
+        """
+        columns = self._columns()
+        # Столбцы с пропусками в объединении после fillna("") имеют тип object
+        na_columns = {column: object for column in columns if column in self.na_columns}
+        for kind in ("exact", "fuzzy"):
+            for path in self.parts[kind]:
+                part = pd.read_pickle(path).reindex(columns=list(columns))
+                part = part.astype(columns).astype(na_columns)
+                # Иначе fillna вернёт числовой тип частям без пропусков
+                with pd.option_context("future.no_silent_downcasting", True):
+                    result = format_part(part)
+                yield result
+
+    def text_columns(self):
+        """Столбцы, которые arrow_safe привёл бы к строкам в объединении частей"""
+        return mixed_columns(self.frames(result_frame))
+
+
+def match_chunked(
+    order_files,
+    df_supplier,
+    path,
+    supplier_index=None,
+    chunk_size=None,
+    output_format=DEFAULT_FORMAT,
+    compression=None,
+    progress=None,
+):
+    """
+    Блочное сопоставление заказов с ограниченным расходом памяти
+
+    Заказ читается и сопоставляется блоками по chunk_size строк с один раз
+    подготовленным каталогом, части результата сбрасываются на диск и
+    дописываются в файл. В памяти одновременно находятся каталог и один
+    блок заказа; результат совпадает с однопроходным режимом.
+
+    :param order_files: Файлы заказов
+    :param df_supplier: Подготовленный каталог поставщика
+    :param path: Путь к файлу результатов без расширения
+    :param supplier_index: Готовый SupplierIndex, иначе строится один раз
+        (ExactIndex строится один раз всегда)
+    :param chunk_size: Количество строк заказа в блоке
+    :param progress: Необязательная функция progress(stage)
+    :return: Путь к файлу с результатами
+    """
+    chunk_size = chunk_size or settings.MATCH_CHUNK_SIZE
+    progress = progress or _no_progress
+    if supplier_index is None and settings.FUZZY_ENGINE != "legacy":
+        supplier_index = SupplierIndex.build(df_supplier)
+    exact_index = ExactIndex(df_supplier)
+    # Одинаковые строки в разных блоках оцениваются нечетким поиском один раз
+    fuzzy_memo = FuzzyMemo(settings.FUZZY_MEMO_SIZE)
+    metrics.add_rows("suppliers", len(df_supplier))
+
+    with tempfile.TemporaryDirectory(
+        prefix="spool_", dir=Path(path).parent
+    ) as spool_dir:
+        spool = ResultSpool(spool_dir)
+        chunks = iter_orders(order_files, chunk_size)
+        while True:
+            with metrics.stage("parse"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                if spool.parts["exact"]:
+                    break
+                # Заказ без строк: пустой блок, как его читает read_file, даёт
+                # столбцы результата однопроходного режима
+                chunk = pd.DataFrame(
+                    {column: [] for column in ORDER_COLUMNS}, columns=ORDER_COLUMNS
+                )
+            # Повтор этапа проверяет отмену задачи между блоками
+            progress("exact_match")
+            df_order = prepare_order(chunk)
+            metrics.add_rows("orders", len(df_order))
+            exact, fuzzy = match_parts(
+                df_order,
+                df_supplier,
+                supplier_index=supplier_index,
+                exact_index=exact_index,
+                fuzzy_memo=fuzzy_memo,
+            )
+            spool.add("exact", exact)
+            if fuzzy is not None:
+                spool.add("fuzzy", fuzzy)
+            del chunk, df_order, exact, fuzzy
+
+        progress("write")
+        with metrics.stage("write"):
+            # Parquet: тип столбца определяется по всем частям, как при записи
+            # их объединения
+            text_columns = spool.text_columns() if output_format == "parquet" else ()
+            with ResultWriter(
+                path, output_format, compression, text_columns
+            ) as writer:
+                for frame in spool.frames():
+                    writer.write(frame)
+
+    logger.info(
+        f"Chunked matching complete. Matches: {writer.rows}, "
+        f"chunks: {len(spool.parts['exact'])}."
+    )
+    return writer.path
+
+
+def batch_summary_row(file_name, result_name, orders, result, seconds, error=""):
+    """Строка сводки пакетного сопоставления для одного файла заказа"""
+    methods = result["Метод"].value_counts() if "Метод" in result else {}
+    return {
+        "Файл": file_name,
+        "Результат": result_name,
+        "Строк заказа": orders,
+        "Сопоставлено": len(result),
+        **{method: int(methods.get(method, 0)) for method in SUMMARY_METHODS},
+        "Без совпадения": orders - len(result),
+        "Время, с": round(seconds, 2),
+        "Ошибка": error,
+    }
+
+
+def match_batch(
+    order_files,
+    df_supplier,
+    path,
+    supplier_index=None,
+    output_format=DEFAULT_FORMAT,
+    compression=None,
+    progress=None,
+):
+    """
+    Пакетное сопоставление: каждый файл заказа отдельно с одним каталогом
+
+    Каталог и его индексы (SupplierIndex, ExactIndex, FuzzyMemo)
+    подготавливаются один раз, файлы заказов сопоставляются по очереди,
+    каждый целиком. Результаты и лист сводки собираются в zip-архив.
+    Файл заказа, который не удалось прочитать, попадает в сводку с текстом
+    ошибки; пакет завершается ошибкой, только если не прочитан ни один.
+
+    :param order_files: Файлы заказов
+    :param df_supplier: Подготовленный каталог поставщика
+    :param path: Путь к архиву без расширения
+    :param supplier_index: Готовый SupplierIndex, иначе строится один раз
+    :param progress: Необязательная функция progress(stage)
+    :return: Путь к архиву
+    """
+    progress = progress or _no_progress
+    if supplier_index is None and settings.FUZZY_ENGINE != "legacy":
+        supplier_index = SupplierIndex.build(df_supplier)
+    exact_index = ExactIndex(df_supplier)
+    fuzzy_memo = FuzzyMemo(settings.FUZZY_MEMO_SIZE)
+    metrics.add_rows("suppliers", len(df_supplier))
+
+    archive_path = Path(f"{path}.zip")
+    summary, errors, names = [], [], set()
+    with tempfile.TemporaryDirectory(
+        prefix="batch_", dir=archive_path.parent
+    ) as batch_dir, zipfile.ZipFile(archive_path, "w") as archive:
+        for file_path in sorted(order_files):
+            file_name = os.path.basename(file_path)
+            # Разные расширения одного имени дают разные имена результатов
+            name, number = Path(file_path).stem, 1
+            while name in names:
+                name, number = f"{Path(file_path).stem}_{number}", number + 1
+            names.add(name)
+
+            start = time.perf_counter()
+            try:
+                df_order = prepare_order(load_orders([file_path]))
+            except FileLoadError as e:
+                logger.error(str(e))
+                errors.append(e)
+                summary.append(
+                    batch_summary_row(
+                        file_name, "", 0, pd.DataFrame(), 0.0, e.reason
+                    )
+                )
+                continue
+            metrics.add_rows("orders", len(df_order))
+            result = join_parts(
+                *match_parts(
+                    df_order,
+                    df_supplier,
+                    supplier_index=supplier_index,
+                    progress=progress,
+                    exact_index=exact_index,
+                    fuzzy_memo=fuzzy_memo,
+                )
+            )
+            with metrics.stage("write"):
+                result_file = write_result(
+                    result, Path(batch_dir) / name, output_format, compression
+                )
+                # xlsx, parquet и сжатые файлы уже сжаты
+                deflate = output_format in TEXT_FORMATS and not compression
+                archive.write(
+                    result_file,
+                    result_file.name,
+                    zipfile.ZIP_DEFLATED if deflate else zipfile.ZIP_STORED,
+                )
+                os.remove(result_file)
+            summary.append(
+                batch_summary_row(
+                    file_name,
+                    result_file.name,
+                    len(df_order),
+                    result,
+                    time.perf_counter() - start,
+                )
+            )
+            logger.info(f"Batch input {file_name} matched. Matches: {len(result)}.")
+            del df_order, result
+
+        if errors and len(errors) == len(summary):
+            raise errors[0]
+
+        progress("write")
+        with metrics.stage("write"):
+            summary_file = write_result(
+                pd.DataFrame(summary), Path(batch_dir) / SUMMARY_NAME, "xlsx"
+            )
+            archive.write(summary_file, summary_file.name, zipfile.ZIP_STORED)
+
+    logger.info(f"Batch matching complete. Inputs: {len(summary)}.")
+    return archive_path
+
+
+def _emit(stream, part):
+    """Запись части результата строками NDJSON с немедленным сбросом на диск"""
+    frame = format_result(part.reindex(columns=RESULT_COLUMNS))
+    if len(frame):
+        stream.write(frame.to_json(orient="records", lines=True, force_ascii=False))
+        stream.flush()
+    return frame
+
+
+def match_streamed(
+    df_order, df_supplier, path, supplier_index=None, progress=None, batch_rows=None
+):
+    """
+    Сопоставление с выдачей результата по частям в NDJSON
+
+    Сначала в файл дописываются все точные совпадения, затем нечеткие
+    блоками по batch_rows строк заказа по мере их оценки, последней
+    строкой - сводка {"summary": ...}. Каждая часть сбрасывается на диск
+    сразу, поэтому файл можно читать, пока сопоставление идёт. Строки
+    совпадений содержат все столбцы результата.
+
+    :param df_order: Подготовленный заказ
+    :param df_supplier: Подготовленный каталог поставщика
+    :param path: Путь к файлу результатов без расширения
+    :param supplier_index: Готовый SupplierIndex, иначе строится один раз
+    :param progress: Необязательная функция progress(stage), вызывается и
+        перед каждым блоком нечеткого поиска
+    :param batch_rows: Строк заказа в блоке нечеткого поиска
+    :return: Путь к файлу с результатами
+    """
+    start = time.perf_counter()
+    progress = progress or _no_progress
+    batch_rows = batch_rows or settings.STREAM_BATCH_ROWS
+    if supplier_index is None and settings.FUZZY_ENGINE != "legacy":
+        supplier_index = SupplierIndex.build(df_supplier)
+    fuzzy_memo = FuzzyMemo(settings.FUZZY_MEMO_SIZE)
+    metrics.add_rows("orders", len(df_order))
+    metrics.add_rows("suppliers", len(df_supplier))
+
+    result_file = result_path(path, "ndjson")
+    methods = {}
+    with open(result_file, "w", encoding="utf-8", newline="") as stream:
+        progress("exact_match")
+        exact, still_unmatched = match_exact(df_order, df_supplier)
+        parts = [_emit(stream, exact)]
+
+        for begin in range(0, len(still_unmatched), batch_rows):
+            # Повтор этапа проверяет отмену задачи между блоками
+            progress("fuzzy_match")
+            fuzzy = match_fuzzy(
+                still_unmatched.iloc[begin : begin + batch_rows],
+                df_supplier,
+                supplier_index=supplier_index,
+                fuzzy_memo=fuzzy_memo,
+            )
+            if fuzzy is not None:
+                parts.append(_emit(stream, fuzzy))
+
+        progress("write")
+        for part in parts:
+            for method, count in part["Метод"].value_counts().items():
+                methods[method] = methods.get(method, 0) + int(count)
+        matches = sum(len(part) for part in parts)
+        summary = {
+            "rows": len(df_order),
+            "matches": matches,
+            "methods": methods,
+            "unmatched": len(df_order) - matches,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        stream.write(json.dumps({"summary": summary}, ensure_ascii=False) + "\n")
+
+    logger.info(f"Streamed matching complete. Matches: {matches}.")
+    return result_file
+
+
+def build_catalog(files_dir: str):
+    """
+    Подготовка и сохранение каталога поставщика для повторного использования
+
+    :param files_dir: Директория с файлами поставщика
+    :return: Метаданные сохранённого каталога
+    """
+    supplier_files = FileFinder(files_dir).find_files_by_extension("xls")
+    try:
+        df_supplier = prepare_supplier(load_suppliers(supplier_files))
+        meta = save_catalog(
+            df_supplier, SupplierIndex.build(df_supplier), supplier_files
+        )
     except Exception as e:
         logger.error(f"{str(type(e).__name__)}: {str(e)}")
         raise e
 
-    return result_dir
+    return meta
+
+
+def update_catalog_files(catalog_id, files_dir, key, deleted=()):
+    """
+    Изменение сохранённого каталога файлами изменений поставщика
 
+    Разбираются и подготавливаются только строки файлов изменений,
+    остальные строки и их индексы берутся из текущей версии каталога.
 
-if __name__ == "__main__":
+    :param catalog_id: Идентификатор сохранённого каталога
+    :param files_dir: Директория с файлами новых и изменённых строк
+        (может быть пустой, если строки только удаляются)
+    :param key: Столбец, по которому ищутся строки (КИЗ или BOOK_ID)
+    :param deleted: Значения ключа удаляемых строк
+    :return: Метаданные новой версии каталога
+    """
+    delta_files = FileFinder(files_dir).find_files_by_extension("xls")
     try:
-        # Загрузка данных
+        df_delta = None
+        if delta_files:
+            df_delta = prepare_supplier(load_suppliers(delta_files))
+        meta = update_catalog(catalog_id, df_delta, key, deleted, delta_files)
+    except Exception as e:
+        logger.error(f"{str(type(e).__name__)}: {str(e)}")
+        raise e
 
-        df_order = pd.concat(
-            [
-                ordHeaderFinder(f, order_head).to_dataframe()[["Код ТМЦ", "Название"]]
-                for f in order_files
-            ]
-        )
-        df_supplier = pd.concat(
-            [
-                supHeaderFinder(f, supplier_head).to_dataframe()[supplier_head]
-                for f in supppliers_files
-            ]
-        )
+    return meta
 
-        # Сопоставление товаров
-        matched_products = match_products(df_order, df_supplier)
 
-        # Сохранение результатов
-        matched_products.to_excel("matched_results.xlsx", index=False)
-        print(f"Сопоставление завершено. Найдено {len(matched_products)} совпадений.")
-        print("Результаты сохранены в matched_results.xlsx")
+def match_products_post(
+    files_dir: str,
+    catalog_id=None,
+    progress=None,
+    output_format=DEFAULT_FORMAT,
+    compression=None,
+    memory_rows=0,
+    batch=False,
+    catalog_version=None,
+    stream=False,
+):
+    """
+    Сопоставление загруженных файлов заказов с файлами поставщика
+
+    :param files_dir: Директория с файлами "заказ" и "код"
+    :param catalog_id: Идентификатор сохранённого каталога; если указан,
+        файлы "код" не нужны и каталог не обрабатывается заново
+    :param progress: Необязательная функция progress(stage), вызывается
+        перед каждым этапом
+    :param output_format: Формат файла результатов (writers.FORMATS)
+    :param compression: Сжатие для текстовых форматов (gzip)
+    :param memory_rows: Результат не больше стольких строк возвращается
+        содержимым файла (bytes) без записи на диск; 0 - всегда файл
+    :param batch: Сопоставить каждый файл заказа отдельно (match_batch)
+        и вернуть zip-архив результатов со сводкой
+    :param catalog_version: Версия каталога, по умолчанию текущая
+    :param stream: Записывать результат в NDJSON по частям (match_streamed)
+    :return: Путь к файлу с результатами или его содержимое
+    """
+    progress = progress or _no_progress
+    dir_rep = FileFinder(files_dir)
+
+    # по части строки ищем по части названия это файл с заказами или кодами
+    order_files = dir_rep.find_files_by_partial_name("заказ")
+    result_path = os.path.join(files_dir, RESULT_NAME)
+    try:
+        # Загрузка данных; в блочном режиме заказ читается при сопоставлении
+        progress("load_orders")
+        if stream or not (settings.MATCH_CHUNK_SIZE or batch):
+            df_order = prepare_order(load_orders(order_files))
+        progress("load_suppliers")
+        if catalog_id:
+            df_supplier, supplier_index = get_catalog(catalog_id, catalog_version)
+        else:
+            supppliers_files = dir_rep.find_files_by_partial_name("код")
+            df_supplier = prepare_supplier(load_suppliers(supppliers_files))
+            supplier_index = None
+
+        if stream:
+            result_dir = match_streamed(
+                df_order,
+                df_supplier,
+                result_path,
+                supplier_index=supplier_index,
+                progress=progress,
+            )
+        elif batch:
+            result_dir = match_batch(
+                order_files,
+                df_supplier,
+                result_path,
+                supplier_index=supplier_index,
+                output_format=output_format,
+                compression=compression,
+                progress=progress,
+            )
+        elif settings.MATCH_CHUNK_SIZE:
+            result_dir = match_chunked(
+                order_files,
+                df_supplier,
+                result_path,
+                supplier_index=supplier_index,
+                output_format=output_format,
+                compression=compression,
+                progress=progress,
+            )
+        else:
+            # Сопоставление товаров
+            matched_products = match_prepared(
+                df_order, df_supplier, supplier_index=supplier_index, progress=progress
+            )
+            logger.info(f"Matching complete. Matches: {len(matched_products)}.")
+            # Сохранение результатов
+            progress("write")
+            if memory_rows and len(matched_products) <= memory_rows:
+                with metrics.stage("write"):
+                    return encode_result(
+                        matched_products, output_format, compression
+                    )
+            with metrics.stage("write"):
+                result_dir = write_result(
+                    matched_products, result_path, output_format, compression
+                )
+        if Path(result_dir).exists():
+            logger.info(f"File {result_dir} succesfuly created")
+        logger.info(f"Results saved into {result_dir}")
 
     except Exception as e:
-        print(f"Произошла ошибка: {str(e)}, {str(type(e).__name__)}")
+        logger.error(f"{str(type(e).__name__)}: {str(e)}")
+        raise e
+
+    return result_dir
+
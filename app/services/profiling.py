@@ -0,0 +1,134 @@
+import cProfile
+import io
+import pstats
+import random
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.settings import settings
+
+PROFILE_DIR = "profile"
+# Report files: kind -> (file name, media type)
+PROFILE_FILES = {
+    "text": ("profile.txt", "text/plain"),
+    "folded": ("profile.folded", "text/plain"),
+    "pstats": ("profile.pstats", "application/octet-stream"),
+}
+
+# Report sections: label -> predicate on pstats (file name, line, function name)
+TRACKED_FUNCTIONS = {
+    "HeaderFinder": lambda file, name: file.endswith("read_excel_f.py"),
+    "extract_attributes": lambda file, name: name.startswith("extract_attributes"),
+    "process.extractOne": lambda file, name: "extractOne" in name or "cdist" in name,
+    "to_excel": lambda file, name: name in ("to_excel", "write_result", "write_xlsx"),
+}
+
+
+def should_profile(requested: bool) -> bool:
+    """Profile on request, or a PROFILE_SAMPLE_RATE share of other sessions."""
+    return requested or random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id: int, interval: float):
+        """Samples call stacks of one thread in collapsed (flamegraph) format."""
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_qualname}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class SessionProfiler:
+    def __init__(self, interval: Optional[float] = None):
+        """
+        Profiles the current thread: exact call counts and times with
+        cProfile plus sampled stacks for flame graphs.
+
+        :param interval: Stack sampling interval in seconds
+        """
+        self.interval = interval or settings.PROFILE_INTERVAL
+        self.profile = cProfile.Profile()
+        self.sampler = None
+
+    def __enter__(self):
+        self.sampler = StackSampler(threading.get_ident(), self.interval)
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.sampler.stop()
+        return False
+
+    def tracked(self) -> Dict[str, list]:
+        """Call counts and times of TRACKED_FUNCTIONS."""
+        stats = pstats.Stats(self.profile).stats
+        report = {label: [] for label in TRACKED_FUNCTIONS}
+        for (file, line, name), (_, ncalls, tottime, cumtime, _) in stats.items():
+            for label, matches in TRACKED_FUNCTIONS.items():
+                if matches(file, name):
+                    report[label].append(
+                        {
+                            "function": f"{Path(file).name}:{line}({name})",
+                            "calls": ncalls,
+                            "tottime": round(tottime, 6),
+                            "cumtime": round(cumtime, 6),
+                        }
+                    )
+        for entries in report.values():
+            entries.sort(key=lambda entry: entry["cumtime"], reverse=True)
+        return report
+
+    def summary(self, top: int) -> str:
+        lines = ["Tracked functions (calls, own time s, total time s)"]
+        for label, entries in self.tracked().items():
+            lines.append(f"\n{label}")
+            if not entries:
+                lines.append("  not called")
+            for entry in entries:
+                lines.append(
+                    f"  {entry['calls']:>9} {entry['tottime']:>10.4f} "
+                    f"{entry['cumtime']:>10.4f}  {entry['function']}"
+                )
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        lines.append(f"\nTop {top} by cumulative time\n")
+        lines.append(stream.getvalue())
+        return "\n".join(lines)
+
+    def save(self, out_dir: Path, top: Optional[int] = None) -> Path:
+        """Write text summary, collapsed stacks and raw pstats into out_dir."""
+        out_dir.mkdir(parents=True, exist_ok=True)
+        (out_dir / PROFILE_FILES["text"][0]).write_text(
+            self.summary(top or settings.PROFILE_TOP), encoding="utf-8"
+        )
+        (out_dir / PROFILE_FILES["folded"][0]).write_text(
+            "".join(
+                f"{stack} {count}\n" for stack, count in self.sampler.stacks.items()
+            ),
+            encoding="utf-8",
+        )
+        self.profile.dump_stats(out_dir / PROFILE_FILES["pstats"][0])
+        return out_dir
@@ -1,9 +1,11 @@
 import os
-from typing import List, Optional, Tuple
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
 import pandas as pd 
 from openpyxl import load_workbook
 from xlrd import open_workbook
 from openpyxl.cell import MergedCell
+from openpyxl.utils import get_column_letter
 
 
 class FileFinder:
@@ -64,6 +66,7 @@ class HeaderFinder:
         self.file_path = file_path
         self.search_terms = [term.lower() for term in search_terms]
         self.header_row = None
+        self.column_mapping = {}
         self.file_type = self._detect_file_type()
 
     def _detect_file_type(self) -> str:
@@ -204,15 +207,164 @@ class HeaderFinder:
             
         return self.header_row, data
 
-    def to_dataframe(self):
-        """Конвертирует данные в pandas DataFrame (требуется установленный pandas)"""
+    def get_columns(self, columns: List[str],
+                    max_rows_to_check: int = 30) -> Tuple[Optional[int], Dict[str, list]]:
+        """
+        Возвращает только указанные столбцы файла за один проход.
+        
+        Файл открывается один раз: строка заголовков ищется среди первых
+        max_rows_to_check строк, после неё чтение данных продолжается без
+        повторного открытия. Найденные столбцы сохраняются в self.column_mapping.
+        
+        :param columns: Названия столбцов из строки заголовков
+        :param max_rows_to_check: Максимальное количество строк для поиска заголовков
+        :return: Кортеж (номер строки с заголовками, словарь столбец -> значения)
+        """
+        if self.file_type == 'xlsx':
+            data = self._get_columns_xlsx(columns, max_rows_to_check)
+        else:
+            data = self._get_columns_xls(columns, max_rows_to_check)
+        return self.header_row, data
+
+    def _scan_header(self, rows, max_rows_to_check: int) -> Tuple[Optional[int], tuple]:
+        """Ищет строку заголовков среди первых строк итератора, не читая дальше неё"""
+        for row_idx, row in enumerate(islice(rows, max_rows_to_check), 1):
+            cell_values = [str(value).lower() if value else "" for value in row]
+            if self._row_contains_terms(cell_values):
+                return row_idx, row
+        return None, ()
+
+    def _column_positions(self, headers: List[str], columns: List[str]) -> Dict[str, int]:
+        """Позиции запрошенных столбцов в строке заголовков"""
+        # При повторяющихся заголовках берётся последний столбец, как в get_data
+        positions = {header: idx for idx, header in enumerate(headers)}
+        missing = [column for column in columns if column not in positions]
+        if missing:
+            raise KeyError(f"Столбцы {missing} не найдены в файле {self.file_path}")
+
+        self.column_mapping = {column: get_column_letter(positions[column] + 1)
+                               for column in columns}
+        return {column: positions[column] for column in columns}
+
+    def _get_columns_xlsx(self, columns: List[str], max_rows_to_check: int) -> Dict[str, list]:
+        """Потоковое чтение выбранных столбцов XLSX файла (read-only, только значения)"""
+        blocks = self._iter_columns_xlsx(columns, max_rows_to_check)
+        try:
+            return next(blocks)
+        finally:
+            blocks.close()
+
+    def _iter_columns_xlsx(self, columns: List[str], max_rows_to_check: int,
+                           chunk_size: Optional[int] = None) -> Iterator[Dict[str, list]]:
+        """Потоковое чтение выбранных столбцов XLSX файла блоками по chunk_size строк"""
+        wb = load_workbook(self.file_path, read_only=True)
+        ws = wb.active
+
+        try:
+            if self.header_row is None:
+                rows = ws.iter_rows(values_only=True)
+                self.header_row, header = self._scan_header(rows, max_rows_to_check)
+            else:
+                rows = ws.iter_rows(min_row=self.header_row, values_only=True)
+                header = next(rows, ())
+
+            headers = [str(value) if value else f"column_{get_column_letter(idx)}"
+                       for idx, value in enumerate(header, 1)]
+            column_positions = self._column_positions(headers, columns)
+
+            while True:
+                data = {column: [] for column in columns}
+                targets = [(data[column], idx) for column, idx in column_positions.items()]
+                for row in islice(rows, chunk_size):
+                    for values, idx in targets:
+                        values.append(row[idx] if idx < len(row) else None)
+                # Без chunk_size весь файл возвращается одним блоком, даже пустым
+                if chunk_size is None or data[columns[0]]:
+                    yield data
+                if chunk_size is None or len(data[columns[0]]) < chunk_size:
+                    break
+        finally:
+            wb.close()
+
+    def _get_columns_xls(self, columns: List[str], max_rows_to_check: int) -> Dict[str, list]:
+        """Чтение выбранных столбцов XLS файла срезами"""
+        wb = open_workbook(self.file_path, on_demand=True)
+        ws = wb.sheet_by_index(0)
+
+        try:
+            if self.header_row is None:
+                rows = (ws.row_values(row_idx) for row_idx in range(ws.nrows))
+                self.header_row, header = self._scan_header(rows, max_rows_to_check)
+            else:
+                header = ws.row_values(self.header_row - 1)
+
+            headers = [str(value) if value else f"column_{idx}"
+                       for idx, value in enumerate(header, 1)]
+            column_positions = self._column_positions(headers, columns)
+
+            data = {column: ws.col_values(idx, start_rowx=self.header_row)
+                    for column, idx in column_positions.items()}
+        finally:
+            wb.release_resources()
+        return data
+
+    def to_dataframe(self, columns: Optional[List[str]] = None):
+        """
+        Конвертирует данные в pandas DataFrame (требуется установленный pandas)
+        
+        :param columns: Если указаны, файл читается за один проход и в DataFrame
+            попадают только эти столбцы; строка заголовков и буквы столбцов
+            сохраняются в df.attrs
+        """
         try:
             import pandas as pd
         except ImportError:
             raise ImportError("Для использования этого метода необходимо установить pandas")
+        if columns is not None:
+            row_num, data = self.get_columns(columns)
+            df = pd.DataFrame(data, columns=columns)
+            # Метаданные: где найдена шапка и из каких столбцов взяты данные
+            df.attrs = {
+                "file": os.path.basename(self.file_path),
+                "header_row": row_num,
+                "columns": self.column_mapping,
+            }
+            return df
         dtyp = ''    
         row_num, data = self.get_data()
         return pd.DataFrame(data)
+
+    def iter_chunks(self, columns: List[str], chunk_size: int,
+                    max_rows_to_check: int = 30):
+        """
+        Читает указанные столбцы блоками DataFrame по chunk_size строк.
+        
+        XLSX файл читается потоково и в памяти находится только текущий блок;
+        XLS файл читается целиком (формат ограничен 65536 строками).
+        Индекс блоков продолжает нумерацию строк файла.
+        
+        :param columns: Названия столбцов из строки заголовков
+        :param chunk_size: Количество строк в блоке
+        :param max_rows_to_check: Максимальное количество строк для поиска заголовков
+        :return: Генератор DataFrame со столбцами columns
+        """
+        import pandas as pd
+
+        if self.file_type == 'xlsx':
+            blocks = self._iter_columns_xlsx(columns, max_rows_to_check, chunk_size)
+        else:
+            _, data = self.get_columns(columns, max_rows_to_check)
+            total = len(data[columns[0]])
+            blocks = ({column: values[start:start + chunk_size]
+                       for column, values in data.items()}
+                      for start in range(0, total, chunk_size))
+
+        start = 0
+        for block in blocks:
+            df = pd.DataFrame(block, columns=columns)
+            df.index = pd.RangeIndex(start, start + len(df))
+            start += len(df)
+            yield df
         
 #home_dir = os.getcwd()   
 #dir_rep = FileFinder('/'.join([home_dir, 'Общее']))
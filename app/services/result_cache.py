@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from app.core.logging import logger
+from app.core.settings import settings
+from app.services.remove_folder import remove_folder
+
+RESULT_CACHE_DIR = settings.RESULT_CACHE_DIR
+
+# Bump when matching logic changes so that old results are not served
+CACHE_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Lookups served by this process
+stats = {"hits": 0, "misses": 0}
+
+
+def enabled() -> bool:
+    return settings.RESULT_CACHE_SIZE > 0
+
+
+def result_key(files: Iterable[Union[str, Path]], params: dict) -> str:
+    """Hash file names, file contents and matching parameters."""
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {"version": CACHE_VERSION, **params}, sort_keys=True, default=str
+        ).encode()
+    )
+    for path in sorted(Path(f) for f in files):
+        digest.update(path.name.encode() + b"\0")
+        with open(path, "rb") as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _link(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _entry_result(entry: Path) -> Optional[Path]:
+    return next((p for p in entry.iterdir() if p.is_file()), None)
+
+
+def fetch(key: str, target_dir: Path) -> Optional[Path]:
+    """Copy cached result into target_dir; None on miss or expired entry."""
+    entry = Path(RESULT_CACHE_DIR) / key
+    try:
+        if time.time() - entry.stat().st_mtime > settings.RESULT_CACHE_TTL:
+            remove_folder(entry)
+            raise FileNotFoundError(entry)
+        cached = _entry_result(entry)
+        if cached is None:
+            raise FileNotFoundError(entry)
+        target = target_dir / cached.name
+        _link(cached, target)
+        # File mtime is the LRU clock, directory mtime the creation time
+        os.utime(cached)
+    except OSError:
+        stats["misses"] += 1
+        return None
+
+    stats["hits"] += 1
+    logger.info("Result cache hit: %s", key)
+    return target
+
+
+def store(
+    key: str, result_path: Union[str, Path], content: Optional[bytes] = None
+) -> None:
+    """Add result file to the cache and evict entries over the size budget.
+
+    With content, the result was built in memory and only the name of
+    result_path is used.
+    """
+    root = Path(RESULT_CACHE_DIR)
+    entry = root / key
+    if entry.exists():
+        return
+
+    tmp_dir = root / f".tmp_{key}_{os.getpid()}"
+    try:
+        tmp_dir.mkdir(parents=True)
+        target = tmp_dir / Path(result_path).name
+        if content is None:
+            _link(Path(result_path), target)
+        else:
+            target.write_bytes(content)
+        os.replace(tmp_dir, entry)
+    except OSError as e:
+        logger.error("Result cache store failed %s: %s", key, e)
+        remove_folder(tmp_dir)
+        return
+
+    evict()
+
+
+def _entries() -> list:
+    """Cache entries as (entry, result file, size) tuples."""
+    entries = []
+    root = Path(RESULT_CACHE_DIR)
+    if not root.exists():
+        return entries
+    for entry in root.iterdir():
+        if entry.name.startswith("."):
+            continue
+        try:
+            cached = _entry_result(entry)
+            if cached is not None:
+                entries.append((entry, cached, cached.stat()))
+        except OSError:
+            continue
+    return entries
+
+
+def evict() -> None:
+    """Remove expired entries, then least recently used ones over the budget."""
+    deadline = time.time() - settings.RESULT_CACHE_TTL
+    entries = []
+    for entry, cached, stat in _entries():
+        try:
+            expired = entry.stat().st_mtime < deadline
+        except OSError:
+            continue
+        if expired:
+            remove_folder(entry)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda item: item[0]):
+        if total <= settings.RESULT_CACHE_SIZE:
+            break
+        remove_folder(entry)
+        total -= size
+
+
+def cache_stats() -> dict:
+    entries = _entries()
+    return {
+        **stats,
+        "entries": len(entries),
+        "size": sum(stat.st_size for _, _, stat in entries),
+        "max_size": settings.RESULT_CACHE_SIZE,
+        "ttl": settings.RESULT_CACHE_TTL,
+    }
+
+
+def clear() -> None:
+    for entry, _, _ in _entries():
+        remove_folder(entry)
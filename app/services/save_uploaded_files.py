@@ -0,0 +1,69 @@
+import asyncio
+from pathlib import Path
+from typing import List
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.logging import logger
+from app.core.settings import settings
+
+ALLOWED_EXTENSIONS = {".xlsx", ".xls"}
+MAX_FILE_SIZE = settings.MAX_FILE_SIZE
+CHUNK_SIZE = settings.UPLOAD_CHUNK_SIZE
+
+
+def validate_file(file: UploadFile) -> None:
+    if not file.filename:
+        raise HTTPException(400, "Filename is required")
+
+    if Path(file.filename).suffix.lower() not in ALLOWED_EXTENSIONS:
+        raise HTTPException(400, f"Only {ALLOWED_EXTENSIONS} files allowed")
+
+
+def validate_file_size(size: int, filename: str):
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(413, f"File {filename} too large")
+
+
+async def save_uploaded_file(file: UploadFile, temp_path: Path) -> Path:
+    """Copy a received upload to disk in chunks, checking MAX_FILE_SIZE.
+
+    The upload is already spooled by Starlette at this point; oversized
+    request bodies are stopped while receiving by RequestSizeLimitMiddleware.
+    """
+    if file.size is not None:
+        validate_file_size(file.size, file.filename)
+
+    file_path = temp_path / Path(file.filename).name
+    size = 0
+    try:
+        with open(file_path, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                validate_file_size(size, file.filename)
+                await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+
+    logger.info("File saved: %s (%s bytes)", file.filename, size)
+    return file_path
+
+
+async def save_uploaded_files(files: List[UploadFile], temp_path: Path) -> None:
+    names = set()
+    for file in files:
+        validate_file(file)
+        name = Path(file.filename).name
+        if name in names:
+            raise HTTPException(400, f"Duplicate filename {name}")
+        names.add(name)
+
+    # Files are written concurrently; the first failure cancels the rest
+    try:
+        async with asyncio.TaskGroup() as group:
+            for file in files:
+                group.create_task(save_uploaded_file(file, temp_path))
+    except ExceptionGroup as e:
+        raise e.exceptions[0]
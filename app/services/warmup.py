@@ -0,0 +1,45 @@
+import time
+
+from app.core import metrics
+from app.core.logging import logger
+from app.services.matchproducts import match_records
+
+# Readiness of this process, see warm_up
+state = {"ready": False, "seconds": None, "error": None}
+
+# One exact and one fuzzy match exercise every stage of the pipeline
+WARMUP_ORDERS = [
+    {"Код ТМЦ": "1", "Название": "футболка AB123-45 цвет черный 44"},
+    {"Код ТМЦ": "2", "Название": "брюки хлопок CD678 серый"},
+]
+WARMUP_SUPPLIERS = [
+    {"Номенклатура": "футболка AB123-45 цвет черный 44", "BOOK_ID": 1, "КИЗ": "1"},
+    {"Номенклатура": "брюки хлопок CD678 цвет серый", "BOOK_ID": 2, "КИЗ": "2"},
+]
+
+
+def warm_up_matching() -> None:
+    """Run a tiny match so first requests do not pay for lazy initialization."""
+    try:
+        match_records(WARMUP_ORDERS, WARMUP_SUPPLIERS)
+    except Exception as e:
+        logger.error("Matching warm-up failed: %s", str(e))
+
+
+def warm_up() -> None:
+    """Warm up this process and the job pool, then report readiness."""
+    from app.services.jobs import start_workers
+
+    start = time.perf_counter()
+    warm_up_matching()
+    try:
+        start_workers()
+    except Exception as e:
+        # Not ready: /ready keeps answering 503 with the error
+        logger.error("Job pool warm-up failed: %s", str(e))
+        state.update(error=str(e), seconds=round(time.perf_counter() - start, 3))
+        return
+
+    state.update(ready=True, seconds=round(time.perf_counter() - start, 3))
+    metrics.mark_startup("ready")
+    logger.info("Warm-up finished in %ss", state["seconds"])
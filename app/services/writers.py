@@ -0,0 +1,247 @@
+import gzip
+import io
+from pathlib import Path
+from typing import BinaryIO, Collection, Optional, Tuple, Union
+
+import pandas as pd
+from fastapi import HTTPException
+from openpyxl import Workbook
+
+from app.services.arrow_safe import arrow_safe
+
+DEFAULT_FORMAT = "xlsx"
+
+# format -> (file extension, media type)
+FORMATS = {
+    "xlsx": (
+        ".xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "ndjson": (".ndjson", "application/x-ndjson"),
+}
+
+# Accept header media types understood in addition to FORMATS media types
+ACCEPT_ALIASES = {
+    "application/x-parquet": "parquet",
+    "application/jsonl": "ndjson",
+    "application/json-lines": "ndjson",
+}
+
+TEXT_FORMATS = {"csv", "ndjson"}
+
+# Batch results: one file per order input plus a summary sheet
+ARCHIVE = (".zip", "application/zip")
+
+# compression -> (file extension suffix, media type)
+COMPRESSIONS = {
+    "gzip": (".gz", "application/gzip"),
+}
+
+
+def resolve_format(
+    output_format: Optional[str], compression: Optional[str], accept: Optional[str]
+) -> Tuple[str, Optional[str]]:
+    """Pick output format from query parameter or Accept header."""
+    if output_format is None and accept:
+        by_media_type = {media_type: name for name, (_, media_type) in FORMATS.items()}
+        by_media_type.update(ACCEPT_ALIASES)
+        for media_range in accept.split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in by_media_type:
+                output_format = by_media_type[media_type]
+                break
+
+    output_format = (output_format or DEFAULT_FORMAT).lower()
+    if output_format not in FORMATS:
+        raise HTTPException(400, f"Only {sorted(FORMATS)} formats supported")
+
+    if compression is not None:
+        compression = compression.lower()
+        if compression not in COMPRESSIONS:
+            raise HTTPException(400, f"Only {sorted(COMPRESSIONS)} compression supported")
+        if output_format not in TEXT_FORMATS:
+            raise HTTPException(400, f"Compression applies only to {sorted(TEXT_FORMATS)}")
+
+    return output_format, compression
+
+
+def result_media_type(path: Union[str, Path]) -> Optional[str]:
+    """Media type of a file written by write_result."""
+    suffixes = Path(path).suffixes
+    if suffixes and suffixes[-1] == ARCHIVE[0]:
+        return ARCHIVE[1]
+    for compression, (suffix, media_type) in COMPRESSIONS.items():
+        if suffixes and suffixes[-1] == suffix:
+            return media_type
+    for extension, media_type in FORMATS.values():
+        if suffixes and suffixes[-1] == extension:
+            return media_type
+    return None
+
+
+def write_xlsx(df: pd.DataFrame, path: Union[Path, BinaryIO]) -> None:
+    """Write DataFrame with openpyxl write-only (streaming) workbook."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([str(column) for column in df.columns])
+    for row in zip(*(df[column].tolist() for column in df.columns)):
+        ws.append(row)
+    wb.save(path)
+
+
+def result_path(
+    path: Union[str, Path],
+    output_format: str = DEFAULT_FORMAT,
+    compression: Optional[str] = None,
+) -> Path:
+    """Target path without extension -> path with format and compression suffix."""
+    extension = FORMATS[output_format][0]
+    if compression:
+        extension += COMPRESSIONS[compression][0]
+    return Path(path).with_suffix(extension)
+
+
+def _write(
+    df: pd.DataFrame,
+    target: Union[Path, BinaryIO],
+    output_format: str,
+    compression: Optional[str],
+) -> None:
+    if output_format == "xlsx":
+        write_xlsx(df, target)
+    elif output_format == "csv":
+        df.to_csv(target, index=False, compression=compression)
+    elif output_format == "parquet":
+        arrow_safe(df).to_parquet(target, index=False)
+    elif output_format == "ndjson":
+        df.to_json(
+            target,
+            orient="records",
+            lines=True,
+            force_ascii=False,
+            compression=compression,
+        )
+
+
+def write_result(
+    df: pd.DataFrame,
+    path: Union[str, Path],
+    output_format: str = DEFAULT_FORMAT,
+    compression: Optional[str] = None,
+) -> Path:
+    """
+    Write result DataFrame in the requested format.
+
+    :param path: Target path without extension
+    :return: Path of the written file
+    """
+    path = result_path(path, output_format, compression)
+    _write(df, path, output_format, compression)
+    return path
+
+
+def encode_result(
+    df: pd.DataFrame,
+    output_format: str = DEFAULT_FORMAT,
+    compression: Optional[str] = None,
+) -> bytes:
+    """Content of the file write_result would write, built in memory."""
+    buffer = io.BytesIO()
+    _write(df, buffer, output_format, compression)
+    return buffer.getvalue()
+
+
+def _open_text(path: Path, compression: Optional[str]):
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+class ResultWriter:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        output_format: str = DEFAULT_FORMAT,
+        compression: Optional[str] = None,
+        text_columns: Collection = (),
+    ):
+        """
+        Append result DataFrame chunks to one file, as write_result would write
+        their concatenation. Chunks must have the same columns.
+
+        :param path: Target path without extension
+        :param text_columns: Columns arrow_safe converts in the concatenation
+            (see mixed_columns); parquet stores them as strings in every chunk
+        """
+        self.path = result_path(path, output_format, compression)
+        self.output_format = output_format
+        self.compression = compression
+        self.text_columns = text_columns
+        self.rows = 0
+        self._file = None
+        self._schema = None
+        self._empty = None
+
+    def __enter__(self):
+        if self.output_format == "xlsx":
+            self._file = Workbook(write_only=True)
+            self._sheet = self._file.create_sheet()
+        elif self.output_format in TEXT_FORMATS:
+            self._file = _open_text(self.path, self.compression)
+        return self
+
+    def write(self, df: pd.DataFrame) -> None:
+        first = self._schema is None
+        if self.output_format == "xlsx":
+            if first:
+                self._sheet.append([str(column) for column in df.columns])
+            for row in zip(*(df[column].tolist() for column in df.columns)):
+                self._sheet.append(row)
+        elif self.output_format == "csv":
+            df.to_csv(self._file, index=False, header=first)
+        elif self.output_format == "ndjson":
+            if len(df):
+                self._file.write(
+                    df.to_json(orient="records", lines=True, force_ascii=False)
+                )
+        elif self.output_format == "parquet" and len(df):
+            self._write_parquet(df)
+        if not len(df):
+            # Written on exit if no rows arrive, as write_result writes it
+            self._empty = df
+        self._schema = self._schema or list(df.columns)
+        self.rows += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = arrow_safe(df, self.text_columns)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._file is None:
+            self._file = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self._file.schema)
+        self._file.write_table(table)
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None and not self.rows:
+            self._write_empty()
+        if self.output_format == "xlsx":
+            if exc_type is None:
+                self._file.save(self.path)
+        elif self._file is not None:
+            self._file.close()
+        return False
+
+    def _write_empty(self) -> None:
+        """Formats that skip empty chunks: write the empty frame itself."""
+        df = self._empty if self._empty is not None else pd.DataFrame()
+        if self.output_format == "ndjson":
+            self._file.write(
+                df.to_json(orient="records", lines=True, force_ascii=False)
+            )
+        elif self.output_format == "parquet":
+            arrow_safe(df).to_parquet(self.path, index=False)
@@ -0,0 +1,224 @@
+"""Synthetic "заказ" and "код" workbooks for benchmarks.
+
+    python -m benchmarks.generate --rows 10000 --out benchmarks/data
+"""
+
+import argparse
+import random
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.worksheet.cell_range import CellRange
+
+from app.services.matchproducts import ORDER_HEAD
+
+PRODUCT_TYPES = [
+    "футболка",
+    "брюки",
+    "платье",
+    "куртка",
+    "халат",
+    "пижама",
+    "шорты",
+    "комплект",
+    "свитер",
+    "комбинезон",
+    "простыня",
+    "пододеяльник",
+]
+MATERIALS = ["", "хлопок", "детский", "(новинка)", "é-lite", "трикотаж", "р."]
+COLORS = [
+    "черный",
+    "белый",
+    "синий",
+    "красный",
+    "зеленый",
+    "серый",
+    "бежевый",
+    "мультиколор",
+]
+SIZES = [
+    "42",
+    "44",
+    "46",
+    "48",
+    "50",
+    "52",
+    "54",
+    "56",
+    "XS",
+    "S",
+    "M",
+    "L",
+    "XL",
+    "XXL",
+    "150x200",
+    "200x220",
+    "150х200х30",
+    "",
+]
+# Supplier columns; "Номенклатура" header cell is merged over two columns
+SUPPLIER_COLUMNS = ["Номенклатура", None, "Артикул", "BOOK_ID", "КИЗ", "Цена"]
+
+
+def article(rng: random.Random) -> str:
+    """Article code in one of the formats extract_attributes recognizes."""
+    letters = "".join(rng.choices("ABCDEFGHJKLMNPRSTUVWXZ", k=rng.randint(2, 3)))
+    kind = rng.randrange(6)
+    if kind == 0:
+        return (
+            f"{letters}{rng.randint(10, 999)}-{rng.randint(10, 99)}"
+            f"/{rng.randint(1, 12):02d}-{rng.randint(20, 25)}"
+        )
+    if kind == 1:
+        return f"{letters}{rng.randint(100, 9999)}-{rng.randint(1, 999)}"
+    if kind == 2:
+        return f"{rng.randint(10, 999)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}"
+    if kind == 3:
+        return f"{letters}{rng.randint(1, 99999)}"
+    if kind == 4:
+        return f"{rng.randint(1, 999)}{letters}{rng.randint(0, 99)}"
+    return ""
+
+
+def product_name(rng: random.Random) -> str:
+    words = [
+        rng.choice(PRODUCT_TYPES),
+        rng.choice(MATERIALS),
+        article(rng),
+        "цвет " + rng.choice(COLORS),
+        rng.choice(SIZES),
+    ]
+    return " ".join(word for word in words if word)
+
+
+def order_name(rng: random.Random, supplier_names: List[str]) -> str:
+    """Order line: copy of a catalog name, a distorted copy or a new product."""
+    kind = rng.random()
+    if kind < 0.6:
+        return rng.choice(supplier_names)
+    if kind < 0.85:
+        name = rng.choice(supplier_names)
+        distortions = [
+            lambda text: text.upper(),
+            lambda text: text.replace("цвет ", ""),
+            lambda text: text.replace(" ", "  ", 1),
+            lambda text: f"{text}, доп",
+            lambda text: text.capitalize(),
+        ]
+        for distort in rng.sample(distortions, rng.randint(1, 2)):
+            name = distort(name)
+        return name
+    return product_name(rng)
+
+
+def _merge(ws, row: int, first_col: int, last_col: int) -> None:
+    # Write-only worksheets have no merge_cells(), ranges are added directly
+    ws.merged_cells.add(
+        CellRange(min_col=first_col, min_row=row, max_col=last_col, max_row=row)
+    )
+
+
+def _title_rows(ws, title: str, width: int, offset: int) -> None:
+    """Document title merged across the table width and a few info rows."""
+    ws.append([title] + [None] * (width - 1))
+    _merge(ws, 1, 1, width)
+    for row in range(offset):
+        ws.append(["Примечание", f"строка {row + 1}"] if row % 2 else [])
+
+
+def write_supplier(path: Path, names: List[str], rng: random.Random, offset: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Каталог")
+    width = len(SUPPLIER_COLUMNS)
+    _title_rows(ws, "Каталог поставщика", width, offset)
+
+    header_row = offset + 2
+    ws.append(SUPPLIER_COLUMNS)
+    _merge(ws, header_row, 1, 2)
+    for book_id, name in enumerate(names, 1):
+        ws.append(
+            [
+                name,
+                None,
+                article(rng) or None,
+                book_id,
+                f"0104{book_id:010d}21{rng.randint(10**5, 10**6 - 1)}",
+                round(rng.uniform(100, 10000), 2),
+            ]
+        )
+    wb.save(path)
+
+
+def write_order(path: Path, names: List[str], rng: random.Random, offset: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Заказ")
+    width = len(ORDER_HEAD) + 1
+    _title_rows(ws, f"Заказ покупателя № {rng.randint(1, 9999)}", width, offset)
+
+    # "Название" header cell is merged over two columns, data goes to the first
+    header_row = offset + 2
+    name_col = ORDER_HEAD.index("Название") + 1
+    header = ORDER_HEAD[:name_col] + [None] + ORDER_HEAD[name_col:]
+    ws.append(header)
+    _merge(ws, header_row, name_col, name_col + 1)
+    for number, name in enumerate(names, 1):
+        quantity = rng.randint(1, 20)
+        price = round(rng.uniform(100, 10000), 2)
+        ws.append(
+            [
+                number,
+                f"ТМЦ-{rng.randint(1, 10**7):07d}",
+                name,
+                None,
+                quantity,
+                price,
+                round(quantity * price, 2),
+            ]
+        )
+    wb.save(path)
+
+
+def generate(
+    rows: int,
+    out_dir: Path,
+    supplier_rows: Optional[int] = None,
+    seed: int = 0,
+    max_offset: int = 10,
+) -> Tuple[Path, Path]:
+    """
+    Write заказ_<rows>.xlsx and код_<rows>.xlsx into out_dir.
+
+    :param rows: Number of order lines
+    :param supplier_rows: Number of catalog lines, defaults to rows
+    :param max_offset: Maximum number of rows above the header
+    :return: Paths of the order and supplier workbooks
+    """
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    supplier_names = [product_name(rng) for _ in range(supplier_rows or rows)]
+    order_names = [order_name(rng, supplier_names) for _ in range(rows)]
+
+    order_path = out_dir / f"заказ_{rows}.xlsx"
+    supplier_path = out_dir / f"код_{rows}.xlsx"
+    write_order(order_path, order_names, rng, rng.randint(0, max_offset))
+    write_supplier(supplier_path, supplier_names, rng, rng.randint(0, max_offset))
+    return order_path, supplier_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000])
+    parser.add_argument("--supplier-rows", type=int, default=None)
+    parser.add_argument("--out", type=Path, default=Path("benchmarks/data"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        for path in generate(rows, args.out, args.supplier_rows, args.seed):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
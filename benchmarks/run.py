@@ -0,0 +1,216 @@
+"""Stage-level benchmark of the matching pipeline.
+
+    python -m benchmarks.run --rows 1000 10000 --output bench.json
+    python -m benchmarks.run --rows 1000 10000 --baseline bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.core import metrics
+from app.core.settings import settings
+from app.services.matchproducts import (
+    ORDER_COLUMNS,
+    ORDER_HEAD,
+    SUPPLIER_HEAD,
+    join_parts,
+    match_parts,
+    prepare_order,
+    prepare_supplier,
+)
+from app.services.read_excel_f import HeaderFinder
+from app.services.writers import write_result
+from benchmarks.generate import generate
+
+# Reported stage -> metrics.stage timing it is read from
+STAGE_TIMINGS = {
+    "header_search": "header_search",
+    "data_load": "data_load",
+    "normalization": "normalize",
+    "extraction": "extract",
+    "exact_merge": "exact_match",
+    "fuzzy": "fuzzy_match",
+    "write": "write",
+}
+STAGES = list(STAGE_TIMINGS)
+# Stages whose frames are measured, see metrics.add_memory
+MEMORY_STAGES = ["parse", "extract", "exact_match", "write"]
+
+
+def run_pipeline(order_path: Path, supplier_path: Path, out_dir: Path, fmt: str):
+    """Run the pipeline once; per-stage timings in seconds and frame memory."""
+    with metrics.record_run() as run:
+        result = _run_pipeline(order_path, supplier_path, out_dir, fmt)
+    result["stages"] = {
+        stage: run["timings"].get(timing, 0.0)
+        for stage, timing in STAGE_TIMINGS.items()
+    }
+    result["memory"] = {
+        stage: run["memory"].get(stage, 0) for stage in MEMORY_STAGES
+    }
+    # Share of texts actually processed after deduplication
+    result["dedup"] = {
+        kind: unique / total for kind, (total, unique) in run["dedup"].items() if total
+    }
+    return result
+
+
+def _run_pipeline(order_path: Path, supplier_path: Path, out_dir: Path, fmt: str):
+    order_finder = HeaderFinder(str(order_path), ORDER_HEAD)
+    supplier_finder = HeaderFinder(str(supplier_path), SUPPLIER_HEAD)
+    with metrics.stage("header_search"):
+        order_finder.find_header()
+        supplier_finder.find_header()
+
+    with metrics.stage("data_load"):
+        df_order = order_finder.to_dataframe(ORDER_COLUMNS)
+        df_supplier = supplier_finder.to_dataframe(SUPPLIER_HEAD)
+    metrics.add_memory("parse", df_order, df_supplier)
+
+    # Production preparation and matching, timed by their own metrics.stage
+    df_order = prepare_order(df_order)
+    df_supplier = prepare_supplier(df_supplier)
+    exact, fuzzy = match_parts(df_order, df_supplier)
+
+    with metrics.stage("write"):
+        result = join_parts(exact, fuzzy)
+        write_result(result, out_dir / "matched_results", fmt)
+
+    return {
+        "order_rows": len(df_order),
+        "supplier_rows": len(df_supplier),
+        "result_rows": len(result),
+    }
+
+
+def benchmark(rows: int, args) -> dict:
+    """Best-of-N timings for one dataset size."""
+    with tempfile.TemporaryDirectory(prefix="bench_") as temp_dir:
+        data_dir = args.data or Path(temp_dir)
+        order_path = data_dir / f"заказ_{rows}.xlsx"
+        supplier_path = data_dir / f"код_{rows}.xlsx"
+        if not (order_path.exists() and supplier_path.exists()):
+            order_path, supplier_path = generate(
+                rows, data_dir, args.supplier_rows, args.seed
+            )
+
+        runs = [
+            run_pipeline(order_path, supplier_path, Path(temp_dir), args.format)
+            for _ in range(args.repeat)
+        ]
+
+    result = runs[0]
+    result["memory"] = {
+        stage: max(run["memory"][stage] for run in runs) for stage in MEMORY_STAGES
+    }
+    result["stages"] = {
+        stage: min(run["stages"][stage] for run in runs) for stage in STAGES
+    }
+    result["dedup"] = runs[0]["dedup"]
+    result["total"] = sum(result["stages"].values())
+    return result
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta: float):
+    """Stages slower than the baseline by more than tolerance and min_delta."""
+    regressions = []
+    for rows, result in current["results"].items():
+        base = baseline["results"].get(rows)
+        if base is None:
+            continue
+        for stage in STAGES + ["total"]:
+            now = result["total"] if stage == "total" else result["stages"][stage]
+            before = base["total"] if stage == "total" else base["stages"].get(stage)
+            if before is None:
+                continue
+            if now > before * (1 + tolerance) and now - before > min_delta:
+                regressions.append(
+                    {"rows": rows, "stage": stage, "baseline": before, "current": now}
+                )
+    return regressions
+
+
+def print_table(current: dict, baseline: dict = None) -> None:
+    for rows, result in current["results"].items():
+        base = (baseline or {}).get("results", {}).get(rows)
+        print(f"\nrows={rows} supplier_rows={result['supplier_rows']}")
+        for stage in STAGES + ["total"]:
+            now = result["total"] if stage == "total" else result["stages"][stage]
+            line = f"  {stage:<14}{now:>10.3f}s"
+            if base:
+                before = base["total"] if stage == "total" else base["stages"][stage]
+                if before:
+                    line += f"{before:>10.3f}s {now / before - 1:>+8.1%}"
+            print(line)
+        memory = "  ".join(
+            f"{stage}={size / 2**20:.1f}MB"
+            for stage, size in result.get("memory", {}).items()
+        )
+        print(f"  frame memory  {memory}")
+        dedup = "  ".join(
+            f"{kind}={share:.0%}" for kind, share in result.get("dedup", {}).items()
+        )
+        print(f"  processed     {dedup}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--supplier-rows", type=int, default=None)
+    parser.add_argument("--data", type=Path, default=None,
+                        help="Directory with generated workbooks to reuse")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--format", default="xlsx")
+    parser.add_argument("--fuzzy-candidates", type=int, default=None,
+                        help="Override FUZZY_CANDIDATES, needed for 100k+ rows")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown relative to the baseline")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="Ignore slowdowns below this many seconds")
+    args = parser.parse_args()
+
+    if args.fuzzy_candidates is not None:
+        settings.FUZZY_CANDIDATES = args.fuzzy_candidates
+
+    current = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": {
+            "fuzzy_engine": settings.FUZZY_ENGINE,
+            "fuzzy_candidates": settings.FUZZY_CANDIDATES,
+            "format": args.format,
+            "repeat": args.repeat,
+        },
+        "results": {str(rows): benchmark(rows, args) for rows in args.rows},
+    }
+
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    print_table(current, baseline)
+
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2), encoding="utf-8")
+
+    if baseline:
+        regressions = compare(current, baseline, args.tolerance, args.min_delta)
+        for item in regressions:
+            print(
+                f"REGRESSION rows={item['rows']} {item['stage']}: "
+                f"{item['baseline']:.3f}s -> {item['current']:.3f}s"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
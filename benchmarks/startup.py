@@ -0,0 +1,134 @@
+"""Cold start of the API server: launch -> /ready -> first match.
+
+    python -m benchmarks.startup --workers 2 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.core.settings import settings
+from benchmarks.generate import order_name, product_name
+
+MODES = ["production", "dev"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode: str, port: int, workers: int) -> list:
+    if mode == "production":
+        return [sys.executable, "-m", "app.server", "--host", "127.0.0.1",
+                "--port", str(port), "--workers", str(workers)]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+            "--port", str(port), "--reload"]
+
+
+def match_request(rows: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    supplier_names = [product_name(rng) for _ in range(rows)]
+    body = {
+        "orders": [
+            {"Код ТМЦ": str(number), "Название": order_name(rng, supplier_names)}
+            for number in range(rows)
+        ],
+        "suppliers": [
+            {"Номенклатура": name, "BOOK_ID": book_id, "КИЗ": str(book_id)}
+            for book_id, name in enumerate(supplier_names, 1)
+        ],
+    }
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+def measure(mode: str, args, body: bytes) -> dict:
+    """Seconds from launch to readiness and to the first finished match."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    process = subprocess.Popen(
+        server_command(mode, port, args.workers),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=os.environ.copy(),
+    )
+    try:
+        wait_ready(url, process, args.timeout)
+        ready = time.monotonic() - start
+
+        request = urllib.request.Request(
+            f"{url}/api/processing/match",
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {settings.API_TOKEN}",
+            },
+        )
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            matches = len(json.load(response)["matches"])
+        first_match = time.monotonic() - start
+    finally:
+        process.terminate()
+        process.wait()
+    return {"ready": ready, "first_match": first_match, "matches": matches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES, nargs="+", default=MODES)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument("--rows", type=int, default=100,
+                        help="Order and catalog rows of the first match")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    body = match_request(args.rows, args.seed)
+    results = {}
+    for mode in args.mode:
+        results[mode] = measure(mode, args, body)
+        print(
+            f"{mode:<12}ready {results[mode]['ready']:>7.3f}s  "
+            f"first match {results[mode]['first_match']:>7.3f}s"
+        )
+
+    if args.output:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "workers": args.workers,
+            "rows": args.rows,
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
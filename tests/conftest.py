@@ -0,0 +1,4 @@
+import os
+
+# Settings требуют токен при импорте app
+os.environ.setdefault("API_TOKEN", "test")
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.attributes import (
+    ATTRIBUTE_COLUMNS,
+    extract_attributes_frame,
+    normalize_texts,
+    unique_texts,
+)
+from app.services.matchproducts import extract_attributes, normalize_text
+
+CORPUS = [
+    "Футболка детская AB123-45/67 цвет черный 44",
+    "футболка, JL126-12/05-25 колор синий р 48",
+    "Брюки 12-34-56 серый 52",
+    "ПЛАТЬЕ abc123 Красное 40",
+    "Шапка 123abc белая",
+    "Комплект постельного белья 200x220x50",
+    "Простыня 150×200 ёлочка",
+    "носки , зелёный 23",
+    "Пижама ёжик 46",
+    "Шорты ab123-4 44",
+    "  куртка   XL\tцвет:  хаки  ",
+    "Кепка one size",
+    "товар-без/атрибутов",
+    "!!!",
+    "",
+    "42",
+    None,
+    np.nan,
+    12345,
+    12.5,
+]
+
+
+def _values(series):
+    return [None if pd.isna(value) else value for value in series]
+
+
+def test_normalize_texts_matches_normalize_text():
+    texts = pd.Series(CORPUS, dtype=object)
+    assert normalize_texts(texts).tolist() == [normalize_text(t) for t in CORPUS]
+
+
+@pytest.mark.parametrize("column", ATTRIBUTE_COLUMNS)
+def test_extract_attributes_frame_matches_extract_attributes(column):
+    frame = extract_attributes_frame(pd.Series(CORPUS, dtype=object))
+    expected = [extract_attributes(text)[column] for text in CORPUS]
+    assert _values(frame[column]) == expected
+
+
+def test_extract_attributes_frame_keeps_index():
+    texts = pd.Series(CORPUS, index=range(100, 100 + len(CORPUS)), dtype=object)
+    frame = extract_attributes_frame(texts)
+    assert frame.index.equals(texts.index)
+    assert list(frame.columns) == ATTRIBUTE_COLUMNS
+
+
+def test_unique_texts_spread_matches_full_column():
+    # Дубликаты, в том числе совпадающие после str(): 12 и "12"
+    texts = pd.Series(CORPUS + CORPUS[::-1] + [12, "12"], dtype=object)
+    uniques, codes = unique_texts(texts)
+    assert len(uniques) < len(texts)
+    spread = extract_attributes_frame(uniques).take(codes).reset_index(drop=True)
+    pd.testing.assert_frame_equal(spread, extract_attributes_frame(texts))
+    assert normalize_texts(uniques).take(codes).tolist() == (
+        normalize_texts(texts).tolist()
+    )
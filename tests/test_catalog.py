@@ -0,0 +1,161 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from app.core.settings import settings
+from app.services import catalog
+from app.services.catalog import load_catalog, save_catalog, update_catalog
+from app.services.fuzzymatch import SupplierIndex
+from app.services.matchproducts import match_prepared, prepare_order, prepare_supplier
+from benchmarks.generate import order_name, product_name
+
+RNG_SEED = 5
+
+
+@pytest.fixture(autouse=True)
+def catalog_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_DIR", tmp_path)
+    catalog._cached_catalog.cache_clear()
+    yield tmp_path
+    catalog._cached_catalog.cache_clear()
+
+
+def _supplier(names, book_ids):
+    return pd.DataFrame(
+        {
+            "Номенклатура": names,
+            "BOOK_ID": book_ids,
+            "КИЗ": [f"K{book_id}" for book_id in book_ids],
+        }
+    )
+
+
+def _save(df):
+    df_supplier = prepare_supplier(df.copy())
+    meta = save_catalog(df_supplier, SupplierIndex.build(df_supplier), ["код.xlsx"])
+    return meta["catalog_id"]
+
+
+def _token_rows(token_index):
+    return {
+        feature: token_index.rows[start:end].tolist()
+        for feature, start, end in zip(
+            token_index.features, token_index.offsets[:-1], token_index.offsets[1:]
+        )
+        if end > start
+    }
+
+
+@pytest.mark.parametrize("candidates", [0, 5])
+def test_delta_matches_rebuilt_catalog(candidates, monkeypatch):
+    monkeypatch.setattr(settings, "FUZZY_CANDIDATES", candidates)
+    rng = random.Random(RNG_SEED)
+    full = _supplier([product_name(rng) for _ in range(80)], list(range(1, 81)))
+    catalog_id = _save(full)
+
+    # Изменённые строки, новые строки и удалённые ключи
+    changed = full.iloc[[3, 10, 40]].assign(
+        Номенклатура=[product_name(rng) for _ in range(3)]
+    )
+    added = _supplier([product_name(rng) for _ in range(4)], [101, 102, 103, 104])
+    deleted = ["K5", "K6", "K70", "K999"]
+    meta = update_catalog(
+        catalog_id,
+        prepare_supplier(pd.concat([changed, added], ignore_index=True)),
+        "КИЗ",
+        deleted,
+    )
+
+    expected = full.copy()
+    expected.loc[changed.index, "Номенклатура"] = changed["Номенклатура"]
+    expected = pd.concat(
+        [expected[~expected["КИЗ"].isin(deleted)], added], ignore_index=True
+    )
+    rebuilt_id = _save(expected)
+
+    assert meta["version"] == 2
+    assert meta["versions"][-1]["updated"] == 3
+    assert meta["versions"][-1]["added"] == 4
+    assert meta["versions"][-1]["deleted"] == 3
+
+    df_delta, index_delta = load_catalog(catalog_id)
+    df_rebuilt, index_rebuilt = load_catalog(rebuilt_id)
+    pd.testing.assert_frame_equal(df_delta, df_rebuilt)
+    assert list(index_delta.choices) == list(index_rebuilt.choices)
+    assert {k: list(v) for k, v in index_delta.blocks.items()} == {
+        k: list(v) for k, v in index_rebuilt.blocks.items()
+    }
+    if candidates:
+        assert _token_rows(index_delta.token_index) == _token_rows(
+            index_rebuilt.token_index
+        )
+        assert np.allclose(
+            index_delta.token_index.totals, index_rebuilt.token_index.totals
+        )
+
+    names = expected["Номенклатура"].tolist()
+    order = pd.DataFrame(
+        {
+            "Код ТМЦ": range(60),
+            "Название": [order_name(rng, names) for _ in range(60)],
+        }
+    )
+    pd.testing.assert_frame_equal(
+        match_prepared(
+            prepare_order(order.copy()), df_delta, supplier_index=index_delta
+        ),
+        match_prepared(
+            prepare_order(order.copy()), df_rebuilt, supplier_index=index_rebuilt
+        ),
+    )
+
+
+def test_delta_keys_compared_as_text():
+    names = ["футболка ab12 цвет черный 44", "брюки cd34 цвет серый 52", "брюки"]
+    # Повтор ключа в каталоге: дельта заменяет первую строку, остальные удаляются
+    catalog_id = _save(_supplier(names, [1, 2, 2]))
+    # 2.0 из Excel и "2" - один ключ; повтор ключа в дельте: побеждает последний
+    delta = _supplier(
+        ["брюки cd34 цвет синий 50", "брюки cd34 цвет белый 48"], [2.0, 2]
+    )
+    meta = update_catalog(catalog_id, prepare_supplier(delta), "BOOK_ID", ["1"])
+
+    df_supplier, _ = load_catalog(catalog_id)
+    assert meta["rows"] == 1
+    assert df_supplier["Номенклатура"].tolist() == ["брюки cd34 цвет белый 48"]
+
+
+def test_delete_only_and_old_versions(catalog_dir, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_VERSIONS", 2)
+    rng = random.Random(RNG_SEED)
+    full = _supplier([product_name(rng) for _ in range(10)], list(range(1, 11)))
+    catalog_id = _save(full)
+
+    for book_id in (1, 2, 3):
+        meta = update_catalog(catalog_id, None, "BOOK_ID", [str(book_id)])
+    assert meta["version"] == 4
+    assert [v["rows"] for v in meta["versions"]] == [10, 9, 8, 7]
+
+    # Хранятся две последние версии, старые удаляются
+    assert sorted(p.name for p in (catalog_dir / catalog_id).glob("v*")) == [
+        "v3",
+        "v4",
+    ]
+    assert len(load_catalog(catalog_id, 3)[0]) == 8
+    with pytest.raises(HTTPException) as error:
+        load_catalog(catalog_id, 2)
+    assert error.value.status_code == 404
+
+
+def test_delta_errors():
+    catalog_id = _save(_supplier(["футболка ab12 цвет черный 44"], [1]))
+    delta = prepare_supplier(_supplier(["брюки cd34 цвет серый 52"], [2]))
+    with pytest.raises(HTTPException) as error:
+        update_catalog(catalog_id, delta, "Номенклатура")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        update_catalog(catalog_id, delta, "КИЗ", ["K2"])
+    assert error.value.status_code == 422
@@ -0,0 +1,91 @@
+import io
+import random
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app.core.settings import settings
+from app.services.matchproducts import ORDER_HEAD, match_products_post
+from benchmarks.generate import generate, order_name, product_name
+
+FORMATS = ["csv", "ndjson", "parquet", "xlsx"]
+
+
+def _write_order(path, codes, names):
+    """Заказ с шапкой ORDER_HEAD в первой строке"""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(ORDER_HEAD)
+    for number, (code, name) in enumerate(zip(codes, names), 1):
+        ws.append([number, code, name, 1, 10.0, 10.0])
+    wb.save(path)
+
+
+def _run(files_dir, output_format, chunk_size, monkeypatch):
+    monkeypatch.setattr(settings, "MATCH_CHUNK_SIZE", chunk_size)
+    path = Path(match_products_post(str(files_dir), output_format=output_format))
+    data = path.read_bytes()
+    path.unlink()
+    return data
+
+
+def _assert_same(single, chunked, output_format):
+    if output_format == "parquet":
+        pd.testing.assert_frame_equal(
+            pd.read_parquet(io.BytesIO(chunked)), pd.read_parquet(io.BytesIO(single))
+        )
+    elif output_format == "xlsx":
+        # В xlsx записано время создания, сравниваются значения
+        pd.testing.assert_frame_equal(
+            pd.read_excel(io.BytesIO(chunked)), pd.read_excel(io.BytesIO(single))
+        )
+    else:
+        assert chunked == single
+
+
+@pytest.fixture(scope="module")
+def files_dir(tmp_path_factory):
+    """Два файла заказа и два файла каталога со смещённой шапкой"""
+    files_dir = tmp_path_factory.mktemp("chunked")
+    generate(150, files_dir, supplier_rows=120, seed=1)
+    generate(90, files_dir, supplier_rows=60, seed=2)
+    return files_dir
+
+
+@pytest.mark.parametrize("output_format", FORMATS)
+@pytest.mark.parametrize("chunk_size", [7, 64, 100_000])
+def test_chunked_matches_single_shot(files_dir, output_format, chunk_size, monkeypatch):
+    single = _run(files_dir, output_format, 0, monkeypatch)
+    chunked = _run(files_dir, output_format, chunk_size, monkeypatch)
+    _assert_same(single, chunked, output_format)
+
+
+@pytest.mark.parametrize("output_format", FORMATS)
+def test_chunked_mixed_codes(tmp_path, output_format, monkeypatch):
+    # Коды-числа в первых блоках и строки в последних: тип столбца
+    # результата определяется по всему заказу
+    rng = random.Random(3)
+    names = [product_name(rng) for _ in range(50)]
+    codes = [i if i < 30 else f"A{i}" for i in range(60)]
+    _write_order(
+        tmp_path / "заказ_1.xlsx", codes, [order_name(rng, names) for _ in codes]
+    )
+    generate(1, tmp_path / "catalog", supplier_rows=50, seed=3)
+    (tmp_path / "catalog" / "код_1.xlsx").rename(tmp_path / "код_1.xlsx")
+
+    single = _run(tmp_path, output_format, 0, monkeypatch)
+    chunked = _run(tmp_path, output_format, 10, monkeypatch)
+    _assert_same(single, chunked, output_format)
+
+
+@pytest.mark.parametrize("output_format", FORMATS)
+def test_chunked_empty_order(tmp_path, output_format, monkeypatch):
+    _write_order(tmp_path / "заказ_1.xlsx", [], [])
+    generate(1, tmp_path / "catalog", supplier_rows=20, seed=4)
+    (tmp_path / "catalog" / "код_1.xlsx").rename(tmp_path / "код_1.xlsx")
+
+    single = _run(tmp_path, output_format, 0, monkeypatch)
+    chunked = _run(tmp_path, output_format, 10, monkeypatch)
+    _assert_same(single, chunked, output_format)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from app.services import matchproducts
+from app.services.exactmatch import ExactIndex
+from app.services.matchproducts import match_exact, match_parts
+
+
+def _order(rows):
+    return pd.DataFrame(
+        rows, columns=["Код ТМЦ", "Название", "product_code", "size", "color"]
+    )
+
+
+def _supplier(rows):
+    df = pd.DataFrame(
+        rows, columns=["Номенклатура", "BOOK_ID", "product_code", "size", "color"]
+    )
+    df["КИЗ"] = [f"K{book_id}" for book_id in df["BOOK_ID"]]
+    return df
+
+
+SUPPLIER = _supplier(
+    [
+        ("футболка ab12 44 черный", 1, "ab12", "44", "черный"),
+        ("футболка ab12 46 белый", 2, "ab12", "46", "белый"),
+        # Повторы ключей: берётся первая строка каталога
+        ("футболка ab12 44 черный повтор", 3, "ab12", "44", "черный"),
+        ("брюки cd34 серый", 4, "cd34", None, "серый"),
+        ("брюки cd34", 5, "cd34", None, None),
+        ("рубашка ef56", 6, "ef56", None, None),
+        ("рубашка ef56 повтор", 7, "ef56", None, None),
+        # Пустой артикул в индекс не попадает
+        ("без артикула 44", 8, None, "44", None),
+    ]
+)
+
+
+def test_stage_order_and_first_row_wins():
+    order = _order(
+        [
+            (1, "футболка ab12 44", "ab12", "44", "белый"),
+            (2, "футболка ab12 48 белый", "ab12", "48", "белый"),
+            (3, "брюки cd34 50 серый", "cd34", "50", "серый"),
+            (4, "футболка ab12 48", "ab12", "48", None),
+            (5, "рубашка ef56", "ef56", None, None),
+        ]
+    )
+    exact, unmatched = match_exact(order, SUPPLIER)
+
+    # Артикул и размер раньше артикула и цвета, затем только артикул
+    assert exact["Метод"].tolist() == [
+        "Артикул и размер",
+        "Артикул и цвет",
+        "Артикул и цвет",
+        "Артикул",
+        "Артикул",
+    ]
+    assert exact["BOOK_ID"].tolist() == [1, 2, 4, 1, 6]
+    assert exact["Код ТМЦ"].tolist() == [1, 2, 3, 4, 5]
+    assert unmatched.empty
+
+
+def test_empty_keys_skipped():
+    order = _order(
+        [
+            (1, "без артикула 44", None, "44", None),
+            (2, "без артикула", np.nan, None, None),
+            (3, "футболка zz99 44", "zz99", "44", None),
+        ]
+    )
+    positions, methods = ExactIndex(SUPPLIER).match(order)
+
+    # Строка каталога с пустым артикулом не совпадает с пустым артикулом заказа
+    assert positions.tolist() == [-1, -1, -1]
+    assert methods.tolist() == [None, None, None]
+
+
+def test_only_unmatched_rows_reach_fuzzy(monkeypatch):
+    order = _order(
+        [
+            (1, "футболка ab12 46", "ab12", "46", None),
+            (2, "носки", None, None, None),
+            (3, "рубашка ef56", "ef56", None, None),
+            (4, "шарф gh78", "gh78", None, None),
+        ]
+    )
+    passed = []
+
+    def match_fuzzy(still_unmatched, *args):
+        passed.append(still_unmatched)
+        return None
+
+    monkeypatch.setattr(matchproducts, "match_fuzzy", match_fuzzy)
+    exact, fuzzy = match_parts(order, SUPPLIER)
+
+    assert exact["Код ТМЦ"].tolist() == [1, 3]
+    assert len(passed) == 1
+    assert passed[0]["Код ТМЦ"].tolist() == [2, 4]
+    assert fuzzy is None
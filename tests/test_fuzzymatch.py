@@ -0,0 +1,86 @@
+import random
+
+import pandas as pd
+import pytest
+from fuzzywuzzy import fuzz, process
+
+from app.services.fuzzymatch import (
+    FUZZY_SCORE_CUTOFF,
+    best_matches,
+    process_choice,
+    process_query,
+)
+from app.services.matchproducts import match_prepared, prepare_order, prepare_supplier
+from benchmarks.generate import order_name, product_name
+
+CHOICES = [
+    "футболка хлопок AB123-45 цвет черный 44",
+    "футболка хлопок AB123-45 цвет черный 44",  # повтор: выигрывает первый
+    "брюки лен 12-34-56 цвет серый 52",
+    "платье ABC123 цвет красный",
+    "",
+    "!!!",
+    "Шапка one size",
+]
+QUERIES = [
+    "ФУТБОЛКА хлопок AB123-45 черный 44",
+    "брюки  лен 12-34-56 цвет серый 52, доп",
+    "платье ABC123",
+    "совсем другой товар",
+    "",
+    "???",
+    "шапка ONE SIZE",
+]
+
+
+def _extract_one(query, choices):
+    """Позиция и оценка лучшего варианта, как в fuzzy_match_legacy"""
+    best = process.extractOne(
+        query,
+        dict(enumerate(choices)),
+        scorer=fuzz.token_set_ratio,
+        score_cutoff=FUZZY_SCORE_CUTOFF,
+    )
+    return (best[2], best[1]) if best else (-1, 0)
+
+
+def test_best_matches_matches_extract_one():
+    positions, scores = best_matches(
+        [process_query(q) for q in QUERIES], [process_choice(c) for c in CHOICES]
+    )
+    expected = [_extract_one(query, CHOICES) for query in QUERIES]
+    assert list(zip(positions.tolist(), scores.tolist())) == expected
+
+
+def _frames(seed, order_rows=300, supplier_rows=200):
+    rng = random.Random(seed)
+    names = [product_name(rng) for _ in range(supplier_rows)]
+    supplier = pd.DataFrame(
+        {
+            "Номенклатура": names,
+            "BOOK_ID": range(supplier_rows),
+            "КИЗ": [f"kiz{i}" for i in range(supplier_rows)],
+        }
+    )
+    # Два файла каталога: метки индекса повторяются, как после load_files
+    half = supplier_rows // 2
+    supplier = pd.concat(
+        [supplier.iloc[:half], supplier.iloc[half:].reset_index(drop=True)]
+    )
+    order = pd.DataFrame(
+        {
+            "Код ТМЦ": range(order_rows),
+            "Название": [order_name(rng, names) for _ in range(order_rows)],
+        }
+    )
+    return order, supplier
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_batched_engine_matches_legacy(seed):
+    order, supplier = _frames(seed)
+    df_supplier = prepare_supplier(supplier)
+    legacy = match_prepared(prepare_order(order.copy()), df_supplier, "legacy")
+    batched = match_prepared(prepare_order(order.copy()), df_supplier, "batched")
+    assert (legacy["Метод"] == "Нечеткое").sum() > 0
+    pd.testing.assert_frame_equal(batched, legacy)
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pytest
+
+from app.core import metrics
+from app.core.settings import settings
+from app.services import matchproducts
+from app.services.matchproducts import (
+    match_parse_plan,
+    match_products_post,
+    parse_file,
+)
+from benchmarks.generate import generate
+
+
+@pytest.fixture
+def files_dir(tmp_path):
+    """Два файла заказа и два файла каталога"""
+    generate(80, tmp_path, supplier_rows=60, seed=3)
+    generate(50, tmp_path, supplier_rows=40, seed=4)
+    return tmp_path
+
+
+def _run(files_dir):
+    path = Path(match_products_post(str(files_dir), output_format="csv"))
+    data = path.read_bytes()
+    path.unlink()
+    return data
+
+
+def test_parsed_files_match_parsing_in_job(files_dir, monkeypatch):
+    monkeypatch.setattr(settings, "LOAD_PARALLEL_MIN_SIZE", 0)
+    in_job = _run(files_dir)
+
+    plan = match_parse_plan(str(files_dir))
+    assert len(plan) == 4
+    for task in plan:
+        parse_file(*task)
+
+    # Все файлы берутся готовыми, повторного разбора нет
+    def read_file(*args):
+        raise AssertionError("file parsed again")
+
+    monkeypatch.setattr(matchproducts, "read_file", read_file)
+    assert _run(files_dir) == in_job
+
+
+def test_small_inputs_have_no_plan(files_dir):
+    assert match_parse_plan(str(files_dir)) == []
+
+
+def test_sources_recorded(files_dir, monkeypatch):
+    monkeypatch.setattr(settings, "LOAD_PARALLEL_MIN_SIZE", 0)
+    with metrics.record_run() as in_job:
+        _run(files_dir)
+
+    for task in match_parse_plan(str(files_dir)):
+        parse_file(*task)
+    with metrics.record_run() as parsed:
+        _run(files_dir)
+
+    # Строка шапки и буквы столбцов каждого файла, заказы затем каталог
+    assert [source["file"] for source in in_job["sources"]] == [
+        "заказ_50.xlsx",
+        "заказ_80.xlsx",
+        "код_50.xlsx",
+        "код_80.xlsx",
+    ]
+    assert all(source["header_row"] > 0 for source in in_job["sources"])
+    assert all(source["columns"] for source in in_job["sources"])
+    assert parsed["sources"] == in_job["sources"]